@@ -22,7 +22,7 @@ export function DataTable({
 
     if (searchTerm && searchable) {
       filtered = rows.filter(row =>
-        Object.values(row.data).some(value =>
+        Object.values(row).some(value =>
           String(value).toLowerCase().includes(searchTerm.toLowerCase())
         )
       );
@@ -30,8 +30,8 @@ export function DataTable({
 
     if (sortColumn) {
       filtered = [...filtered].sort((a, b) => {
-        const aValue = a.data[sortColumn];
-        const bValue = b.data[sortColumn];
+        const aValue = a[sortColumn];
+        const bValue = b[sortColumn];
         
         if (typeof aValue === "number" && typeof bValue === "number") {
           return sortDirection === "asc" ? aValue - bValue : bValue - aValue;
@@ -118,7 +118,7 @@ export function DataTable({
                         key={column.key}
                         className="p-4 align-middle"
                       >
-                        {String(row.data[column.key] || "")}
+                        {String(row[column.key] || "")}
                       </td>
                     ))}
                   </tr>
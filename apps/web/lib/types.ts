@@ -33,9 +33,8 @@ export interface TableColumn {
   sortable?: boolean;
 }
 
-export interface TableRow {
-  data: Record<string, unknown>;
-}
+// Column key to cell value
+export type TableRow = Record<string, unknown>;
 
 export interface DataTableProps {
   type: "data_table";
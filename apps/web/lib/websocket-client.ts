@@ -8,6 +8,8 @@ export interface WebSocketMessage {
   data?: QueryResponse;
 }
 
+const textDecoder = new TextDecoder();
+
 export class WebSocketClient {
   private ws: WebSocket | null = null;
   private url: string;
@@ -23,6 +25,8 @@ export class WebSocketClient {
     return new Promise((resolve, reject) => {
       try {
         this.ws = new WebSocket(this.url);
+        // The server sends JSON as binary frames (UTF-8 bytes)
+        this.ws.binaryType = "arraybuffer";
         
         this.ws.onopen = () => {
           console.log("WebSocket connected");
@@ -71,7 +75,9 @@ export class WebSocketClient {
 
     this.ws.onmessage = (event) => {
       try {
-        const message: WebSocketMessage = JSON.parse(event.data);
+        const payload =
+          typeof event.data === "string" ? event.data : textDecoder.decode(event.data);
+        const message: WebSocketMessage = JSON.parse(payload);
         callback(message);
       } catch (error) {
         console.error("Error parsing WebSocket message:", error);
@@ -164,14 +164,8 @@ export class SchemaGenerator {
       definition.type = 'array';
       definition.items = {
         type: 'object',
-        properties: {
-          data: { 
-            type: 'object', 
-            description: 'Row data as key-value pairs',
-            additionalProperties: true,
-          },
-        },
-        required: ['data'],
+        description: 'Row data as column key to cell value',
+        additionalProperties: true,
       };
     }
 
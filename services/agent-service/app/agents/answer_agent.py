@@ -1,16 +1,66 @@
-from langchain.prompts import PromptTemplate
 from langchain.schema import BaseOutputParser
 from langchain_core.language_models import BaseChatModel
-from langchain_core.messages import HumanMessage, AIMessage, ToolMessage
+from langchain_core.messages import HumanMessage, AIMessage, ToolMessage, SystemMessage
+from langchain_core.runnables import RunnableLambda
 from langchain.tools import BaseTool
-from langgraph.graph import StateGraph, END
-from langgraph.prebuilt import ToolNode
-from typing import Dict, Any, List, TypedDict, Annotated
+from typing import TYPE_CHECKING, Dict, Any, List, Optional, Tuple, TypedDict, Annotated, AsyncIterator
+import functools
 import operator
 import re
 import random
 import json
 
+if TYPE_CHECKING:
+    from langgraph.graph import StateGraph
+
+
+# Weather intent keywords; a leading word boundary still matches "rainy", "forecasts"
+_WEATHER_RE = re.compile(
+    r"\b(?:weather|temperature|forecast|climate|rain|snow|sunny|cloudy)", re.IGNORECASE
+)
+
+# Capitalized place name directly after a weather noun, e.g. "weather in New York today"
+_CITY_RE = re.compile(
+    r"\b(?i:weather|forecast|temperature)s?\s+(?i:in|for|at)\s+([A-Z][\w'-]*(?:\s+[A-Z][\w'-]*)*)"
+)
+
+# Capitalized words that follow "forecast for" without naming a place
+_NON_CITY_WORDS = frozenset(
+    day.lower() for day in (
+        "Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday",
+        "Today", "Tonight", "Tomorrow",
+    )
+)
+
+# Mock weather conditions and the card icon each one renders with
+_CONDITION_ICONS = {
+    "Sunny": "sunny",
+    "Cloudy": "cloudy",
+    "Partly Cloudy": "cloudy",
+    "Rainy": "rainy",
+    "Clear": "sunny",
+    "Overcast": "cloudy",
+}
+_CONDITIONS = tuple(_CONDITION_ICONS)
+
+# Kept byte-identical across requests so providers can cache the prompt prefix
+WEATHER_SYSTEM_PROMPT = """You are a helpful assistant that can get weather information for any city.
+
+When a user asks about weather, use the get_weather tool to get current weather data.
+After getting weather information, provide a comprehensive and friendly response."""
+
+FALLBACK_PROMPT_TEMPLATE = """You are a helpful assistant that provides clear, informative answers to user questions.
+
+User Query: {query}
+Context: {context}
+
+Please provide a comprehensive answer to the user's question. Be factual, helpful, and concise.
+If the query is about weather, include relevant details like temperature, conditions, etc.
+If the query is about data analysis, explain trends and insights.
+If the query is general information, provide accurate and useful details.
+
+Answer:"""
+
 
 class AnswerOutputParser(BaseOutputParser):
     def parse(self, text: str) -> str:
@@ -23,17 +73,39 @@ class AgentState(TypedDict):
     final_answer: str
 
 
+# Graph node callables are free functions with their dependencies bound via
+# functools.partial in _build_graph, keeping attribute lookups off the per-step path
+def _call_model_impl(state: AgentState, llm: Any) -> Dict[str, Any]:
+    """Call the model with current state"""
+    return {"messages": [llm.invoke(state["messages"])]}
+
+
+async def _acall_model_impl(state: AgentState, llm: Any) -> Dict[str, Any]:
+    """Async version of _call_model_impl, so graph.ainvoke never blocks the loop"""
+    return {"messages": [await llm.ainvoke(state["messages"])]}
+
+
+def _should_continue(state: Dict[str, Any]) -> str:
+    """Determine if we should continue with tool calls or end"""
+    last_message = state["messages"][-1]
+    
+    # If there are tool calls, continue to tools
+    if getattr(last_message, "tool_calls", None):
+        return "continue"
+    
+    return "end"
+
+
 class MockWeatherTool(BaseTool):
     name: str = "get_weather"
     description: str = "Get current weather information for any city"
+    # The structured data rides along as the ToolMessage artifact
+    response_format: str = "content_and_artifact"
     
-    def _run(self, city: str) -> str:
+    def _run(self, city: str) -> Tuple[str, Dict[str, Any]]:
         """Generate mock weather data for a city"""
-        conditions = ["Sunny", "Cloudy", "Partly Cloudy", "Rainy", "Clear", "Overcast"]
-        icons = ["sunny", "cloudy", "cloudy", "rainy", "sunny", "cloudy"]
-        
-        condition = random.choice(conditions)
-        icon = icons[conditions.index(condition)]
+        condition = random.choice(_CONDITIONS)
+        icon = _CONDITION_ICONS[condition]
         temperature = random.randint(-5, 35)
         humidity = random.randint(30, 90)
         wind_speed = random.randint(5, 25)
@@ -47,9 +119,10 @@ class MockWeatherTool(BaseTool):
             "icon": icon
         }
         
-        return f"Current weather in {city}: {temperature}°C, {condition}. Humidity: {humidity}%, Wind: {wind_speed} km/h"
+        summary = f"Current weather in {city}: {temperature}°C, {condition}. Humidity: {humidity}%, Wind: {wind_speed} km/h"
+        return summary, weather_data
     
-    async def _arun(self, city: str) -> str:
+    async def _arun(self, city: str) -> Tuple[str, Dict[str, Any]]:
         return self._run(city)
 
 
@@ -61,7 +134,6 @@ class AnswerAgent:
         # Initialize mock weather tool
         self.weather_tool = MockWeatherTool()
         self.tools = [self.weather_tool]
-        self.tool_node = ToolNode(self.tools)
         
         # Bind tools to LLM
         self.llm_with_tools = self.llm.bind_tools(self.tools)
@@ -69,28 +141,26 @@ class AnswerAgent:
         # Build the LangGraph agent
         self.graph = self._build_graph()
         
-        # Fallback prompt for direct responses
-        self.fallback_prompt = PromptTemplate(
-            input_variables=["query", "context"],
-            template="""You are a helpful assistant that provides clear, informative answers to user questions.
-
-User Query: {query}
-Context: {context}
-
-Please provide a comprehensive answer to the user's question. Be factual, helpful, and concise.
-If the query is about weather, include relevant details like temperature, conditions, etc.
-If the query is about data analysis, explain trends and insights.
-If the query is general information, provide accurate and useful details.
-
-Answer:"""
-        )
+        # Fallback prompt for direct responses, formatted with str.format
+        self.fallback_prompt = FALLBACK_PROMPT_TEMPLATE
     
-    def _build_graph(self) -> StateGraph:
+    def _build_graph(self) -> "StateGraph":
         """Build the LangGraph agent workflow"""
+        # langgraph is slow to import, so it is only loaded once an agent is built
+        from langgraph.graph import StateGraph, END
+        from langgraph.prebuilt import ToolNode
+
+        self.tool_node = ToolNode(self.tools)
         workflow = StateGraph(AgentState)
         
         # Add nodes
-        workflow.add_node("agent", self._call_model)
+        workflow.add_node(
+            "agent",
+            RunnableLambda(
+                functools.partial(_call_model_impl, llm=self.llm_with_tools),
+                afunc=functools.partial(_acall_model_impl, llm=self.llm_with_tools),
+            ),
+        )
         workflow.add_node("tools", self.tool_node)
         
         # Set the entrypoint
@@ -99,7 +169,7 @@ Answer:"""
         # Add conditional edges
         workflow.add_conditional_edges(
             "agent",
-            self._should_continue,
+            _should_continue,
             {
                 "continue": "tools",
                 "end": END,
@@ -111,42 +181,52 @@ Answer:"""
         
         return workflow.compile()
     
-    def _call_model(self, state: AgentState) -> Dict[str, Any]:
-        """Call the model with current state"""
-        messages = state["messages"]
-        response = self.llm_with_tools.invoke(messages)
-        return {"messages": [response]}
-    
-    def _should_continue(self, state: AgentState) -> str:
-        """Determine if we should continue with tool calls or end"""
-        messages = state["messages"]
-        last_message = messages[-1]
-        
-        # If there are tool calls, continue to tools
-        if hasattr(last_message, 'tool_calls') and last_message.tool_calls:
-            return "continue"
-        
-        return "end"
-    
     def _should_use_weather_tool(self, query: str) -> bool:
         """Determine if a query requires weather information"""
-        weather_indicators = ["weather", "temperature", "forecast", "climate", "rain", "snow", "sunny", "cloudy"]
-        query_lower = query.lower()
-        return any(indicator in query_lower for indicator in weather_indicators)
+        return _WEATHER_RE.search(query) is not None
+    
+    def _collect_tool_results(self, messages: List[Any]) -> Dict[str, Any]:
+        """Map tool outputs in the conversation to the answer's tool results"""
+        tool_results = {}
+        for message in messages:
+            if isinstance(message, ToolMessage) and message.name == self.weather_tool.name:
+                if message.artifact:
+                    tool_results["weather"] = message.artifact
+        return tool_results
+    
+    def _extract_city(self, query: str) -> Optional[str]:
+        """Pull the city name out of a weather query, if it names one"""
+        match = _CITY_RE.search(query)
+        if not match:
+            return None
+        city = match.group(1)
+        if city.split()[0].lower() in _NON_CITY_WORDS:
+            return None
+        return city
     
     def generate_answer(self, query: str, context: str = "") -> str:
+        answer, _ = self.generate_answer_with_tool_results(query, context)
+        return answer
+    
+    def generate_answer_with_tool_results(
+        self, query: str, context: str = ""
+    ) -> Tuple[str, Dict[str, Any]]:
+        """Generate the answer along with structured data from any tools used"""
         try:
             # Check if weather information is needed
             if self._should_use_weather_tool(query):
-                # Use LangGraph agent with weather tool
-                system_message = """You are a helpful assistant that can get weather information for any city.
-
-When a user asks about weather, use the get_weather tool to get current weather data.
-After getting weather information, provide a comprehensive and friendly response."""
+                # Answer straight from the weather tool when the city is known,
+                # skipping both LLM round-trips of the tool-calling loop
+                city = self._extract_city(query)
+                if city:
+                    summary, weather_data = self.weather_tool._run(city)
+                    return summary, {"weather": weather_data}
                 
+                # Use LangGraph agent with weather tool
                 initial_state = {
                     "messages": [
-                        HumanMessage(content=f"System: {system_message}\n\nUser Query: {query}")
+                        SystemMessage(content=WEATHER_SYSTEM_PROMPT),
+                        HumanMessage(content=f"User Query: {query}")
                     ],
                     "query": query,
                     "final_answer": ""
@@ -156,32 +236,43 @@ After getting weather information, provide a comprehensive and friendly response
                 final_message = result["messages"][-1]
                 
                 if hasattr(final_message, 'content') and final_message.content:
-                    return self.parser.parse(final_message.content)
+                    tool_results = self._collect_tool_results(result["messages"])
+                    return self.parser.parse(final_message.content), tool_results
             
             # Direct LLM response for general queries
             formatted_prompt = self.fallback_prompt.format(query=query, context=context)
             response = self.llm.invoke(formatted_prompt)
-            return self.parser.parse(response.content)
+            return self.parser.parse(response.content), {}
             
         except Exception:
             # If anything fails, use fallback prompt
             formatted_prompt = self.fallback_prompt.format(query=query, context=context)
             response = self.llm.invoke(formatted_prompt)
-            return self.parser.parse(response.content)
+            return self.parser.parse(response.content), {}
     
     async def agenerate_answer(self, query: str, context: str = "") -> str:
+        answer, _ = await self.agenerate_answer_with_tool_results(query, context)
+        return answer
+    
+    async def agenerate_answer_with_tool_results(
+        self, query: str, context: str = ""
+    ) -> Tuple[str, Dict[str, Any]]:
+        """Generate the answer along with structured data from any tools used"""
         try:
             # Check if weather information is needed
             if self._should_use_weather_tool(query):
-                # Use LangGraph agent with weather tool
-                system_message = """You are a helpful assistant that can get weather information for any city.
-
-When a user asks about weather, use the get_weather tool to get current weather data.
-After getting weather information, provide a comprehensive and friendly response."""
+                # Answer straight from the weather tool when the city is known,
+                # skipping both LLM round-trips of the tool-calling loop
+                city = self._extract_city(query)
+                if city:
+                    summary, weather_data = self.weather_tool._run(city)
+                    return summary, {"weather": weather_data}
                 
+                # Use LangGraph agent with weather tool
                 initial_state = {
                     "messages": [
-                        HumanMessage(content=f"System: {system_message}\n\nUser Query: {query}")
+                        SystemMessage(content=WEATHER_SYSTEM_PROMPT),
+                        HumanMessage(content=f"User Query: {query}")
                     ],
                     "query": query,
                     "final_answer": ""
@@ -191,15 +282,29 @@ After getting weather information, provide a comprehensive and friendly response
                 final_message = result["messages"][-1]
                 
                 if hasattr(final_message, 'content') and final_message.content:
-                    return self.parser.parse(final_message.content)
+                    tool_results = self._collect_tool_results(result["messages"])
+                    return self.parser.parse(final_message.content), tool_results
             
             # Direct LLM response for general queries
-            formatted_prompt = self.fallback_prompt.format(query=query, context=context)
-            response = await self.llm.ainvoke(formatted_prompt)
-            return self.parser.parse(response.content)
+            return await self._afallback_answer(query, context), {}
             
         except Exception:
             # If anything fails, use fallback prompt
-            formatted_prompt = self.fallback_prompt.format(query=query, context=context)
-            response = await self.llm.ainvoke(formatted_prompt)
-            return self.parser.parse(response.content)
\ No newline at end of file
+            return await self._afallback_answer(query, context), {}
+    
+    async def _afallback_answer(self, query: str, context: str = "") -> str:
+        """Answer with the plain fallback prompt, without tools or streaming"""
+        formatted_prompt = self.fallback_prompt.format(query=query, context=context)
+        response = await self.llm.ainvoke(formatted_prompt)
+        return self.parser.parse(response.content)
+    
+    async def astream_answer(self, query: str, context: str = "") -> AsyncIterator[str]:
+        """
+        Stream the answer chunk by chunk as the LLM generates it. Weather
+        queries need the tool loop, so they go through
+        agenerate_answer_with_tool_results instead.
+        """
+        formatted_prompt = self.fallback_prompt.format(query=query, context=context)
+        async for chunk in self.llm.astream(formatted_prompt):
+            if chunk.content:
+                yield chunk.content
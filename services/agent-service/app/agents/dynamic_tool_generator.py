@@ -1,7 +1,42 @@
 from langchain.tools import Tool
-from typing import Dict, Any, List, Callable
+from typing import Dict, Any, List, Callable, Type
 from pydantic import BaseModel, Field, create_model
-import json
+import hashlib
+import logging
+import re
+
+import orjson
+
+
+logger = logging.getLogger(__name__)
+
+# The same schemas arrive with every request; building a model or tool is far
+# costlier than hashing its definition, so both are reused across requests.
+# Schemas come from the request body, so both caches are capped
+MODEL_CACHE_SIZE = 256
+TOOL_CACHE_SIZE = 256
+_MODEL_CACHE: Dict[str, Type[BaseModel]] = {}
+_TOOL_CACHE: Dict[str, Tool] = {}
+
+# Word boundaries inside a CamelCase schema name, e.g. "WeatherCard" -> "weather_card"
+_CAMEL_BOUNDARY_RE = re.compile(r"(?<=[a-z0-9])(?=[A-Z])")
+
+# JSON schema type -> Python type for the generated parameter models
+_TYPE_MAP: Dict[str, Any] = {
+    "string": str,
+    "integer": int,
+    "number": float,
+    "boolean": bool,
+    "array": List[Dict[str, Any]],  # Simplified array type
+    "object": Dict[str, Any],
+}
+
+
+def _definition_key(definition: Dict[str, Any]) -> str:
+    """
+    Stable hash of a schema definition, independent of key order.
+    """
+    return hashlib.sha1(orjson.dumps(definition, option=orjson.OPT_SORT_KEYS)).hexdigest()
 
 
 class DynamicToolGenerator:
@@ -14,9 +49,17 @@ class DynamicToolGenerator:
         """
         Create a LangChain tool from a component schema.
         """
+        # The tool closes over the whole schema, so the whole schema is the key
+        cache_key = _definition_key(schema)
+        cached_tool = _TOOL_CACHE.get(cache_key)
+        if cached_tool is not None:
+            return cached_tool
+
         tool_def = schema.get("tool_definition", {})
         tool_name = tool_def.get("name", f"render_{schema['name'].lower()}")
         tool_description = tool_def.get("description", f"Render {schema['name']} component")
+        # Same tags as the built-in components, so "WeatherCard" renders as "weather_card"
+        component_type = _CAMEL_BOUNDARY_RE.sub("_", schema["name"]).lower().replace(" ", "_")
         
         # Create the tool function
         def tool_function(**kwargs) -> str:
@@ -28,20 +71,20 @@ class DynamicToolGenerator:
             required_params = tool_def.get("parameters", {}).get("required", [])
             for param in required_params:
                 if param not in kwargs:
-                    return json.dumps({
+                    return orjson.dumps({
                         "error": f"Missing required parameter: {param}"
-                    })
+                    }).decode()
             
             # Create component response
             component_data = {
-                "type": schema["name"].lower().replace(" ", "_"),
+                "type": component_type,
                 **kwargs
             }
             
-            return json.dumps({
+            return orjson.dumps({
                 "component": component_data,
                 "reasoning": f"Selected {schema['name']} component based on the provided data"
-            })
+            }).decode()
 
         # Create parameter schema for the tool
         parameters_schema = DynamicToolGenerator._create_parameter_schema(tool_def)
@@ -54,6 +97,10 @@ class DynamicToolGenerator:
             args_schema=parameters_schema
         )
         
+        if len(_TOOL_CACHE) >= TOOL_CACHE_SIZE:
+            # Evict the oldest entry
+            del _TOOL_CACHE[next(iter(_TOOL_CACHE))]
+        _TOOL_CACHE[cache_key] = tool
         return tool
 
     @staticmethod
@@ -62,6 +109,11 @@ class DynamicToolGenerator:
         Create a Pydantic model for tool parameters from the schema definition.
         """
         parameters = tool_def.get("parameters", {})
+        cache_key = _definition_key(parameters)
+        cached_model = _MODEL_CACHE.get(cache_key)
+        if cached_model is not None:
+            return cached_model
+
         properties = parameters.get("properties", {})
         required_fields = set(parameters.get("required", []))
         
@@ -85,12 +137,18 @@ class DynamicToolGenerator:
         
         # Create dynamic Pydantic model
         if field_definitions:
-            return create_model("ToolParameters", **field_definitions)
+            model = create_model("ToolParameters", **field_definitions)
         else:
             # Return empty model if no parameters
             class EmptyParameters(BaseModel):
                 pass
-            return EmptyParameters
+            model = EmptyParameters
+
+        if len(_MODEL_CACHE) >= MODEL_CACHE_SIZE:
+            # Evict the oldest entry
+            del _MODEL_CACHE[next(iter(_MODEL_CACHE))]
+        _MODEL_CACHE[cache_key] = model
+        return model
 
     @staticmethod
     def _get_python_type(param_def: Dict[str, Any]):
@@ -98,21 +156,10 @@ class DynamicToolGenerator:
         Convert JSON schema type to Python type for Pydantic.
         """
         param_type = param_def.get("type", "string")
-        
-        if param_type == "string":
+        if not isinstance(param_type, str):
+            # e.g. a ["string", "null"] union; unhashable, so not a map key
             return str
-        elif param_type == "integer":
-            return int
-        elif param_type == "number":
-            return float
-        elif param_type == "boolean":
-            return bool
-        elif param_type == "array":
-            return List[Dict[str, Any]]  # Simplified array type
-        elif param_type == "object":
-            return Dict[str, Any]
-        else:
-            return str  # Default fallback
+        return _TYPE_MAP.get(param_type, str)  # str is the default fallback
 
     @staticmethod
     def create_tools_from_schemas(schemas: List[Dict[str, Any]]) -> List[Tool]:
@@ -125,8 +172,8 @@ class DynamicToolGenerator:
             try:
                 tool = DynamicToolGenerator.create_tool_from_schema(schema)
                 tools.append(tool)
-            except Exception as e:
-                print(f"Error creating tool for schema {schema.get('name', 'unknown')}: {e}")
+            except Exception:
+                logger.exception("Error creating tool for schema %s", schema.get("name", "unknown"))
                 continue
         
         return tools
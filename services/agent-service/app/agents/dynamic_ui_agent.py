@@ -1,34 +1,76 @@
 from langchain.schema import HumanMessage, AIMessage
 from langchain_core.language_models import BaseChatModel
-from langchain.agents import AgentExecutor, create_tool_calling_agent
 from langchain.prompts import ChatPromptTemplate
-from typing import Dict, Any, List
-import json
+from typing import Dict, Any, Hashable, List, Optional, Tuple
+import hashlib
+import logging
+
+import orjson
 
 from .dynamic_tool_generator import DynamicToolGenerator
 
 
+logger = logging.getLogger(__name__)
+
+# Distinct schema sets whose executors each agent keeps around
+EXECUTOR_CACHE_SIZE = 32
+# Distinct tool lists whose system prompts each agent keeps around
+SYSPROMPT_CACHE_SIZE = 32
+
+
 class DynamicUIAgent:
     """
     UI Agent that uses dynamically generated tools from schemas.
     """
 
-    def __init__(self, llm: BaseChatModel):
+    # Copied per use with the content filled in
+    _FALLBACK_TEMPLATE = {
+        "type": "info_card",
+        "title": "Response",
+        "content": None,
+        "variant": "default"
+    }
+
+    def __init__(self, llm: BaseChatModel, verbose: bool = False):
         self.llm = llm
+        # AgentExecutor's step-by-step stdout trace; for local debugging only
+        self.verbose = verbose
         self.tools = []
         self.agent_executor = None
+        # System prompts by (name, description) of each tool, in order
+        self._sysprompt_cache: Dict[Tuple[Tuple[str, str], ...], str] = {}
+        # (tools, executor) by schema-set hash. Kept per agent rather than per
+        # module because an executor is bound to this agent's LLM
+        self._executor_cache: Dict[Hashable, Tuple[List[Any], Any]] = {}
 
-    def initialize_tools(self, schemas: List[Dict[str, Any]]):
+    def initialize_tools(self, schemas: List[Dict[str, Any]], cache_key: Optional[Hashable] = None):
         """
-        Initialize the agent with tools generated from schemas.
+        Initialize the agent with tools generated from schemas. `cache_key`,
+        when the caller already has one that identifies the schemas, spares
+        hashing them again.
         """
+        if cache_key is None:
+            cache_key = hashlib.sha1(orjson.dumps(schemas, option=orjson.OPT_SORT_KEYS)).hexdigest()
+        cached = self._executor_cache.get(cache_key)
+        if cached is not None:
+            self.tools, self.agent_executor = cached
+            return
+
         self.tools = DynamicToolGenerator.create_tools_from_schemas(schemas)
         self._create_agent()
 
+        if len(self._executor_cache) >= EXECUTOR_CACHE_SIZE:
+            # Evict the oldest entry
+            del self._executor_cache[next(iter(self._executor_cache))]
+        self._executor_cache[cache_key] = (self.tools, self.agent_executor)
+
     def _create_agent(self):
         """
         Create the tool-calling agent with dynamic tools.
         """
+        # langchain.agents pulls in a large import tree; defer it to first use
+        from langchain.agents import AgentExecutor, create_tool_calling_agent
+
         if not self.tools:
             # Create fallback tool if no schemas provided
             self.tools = [self._create_fallback_tool()]
@@ -43,7 +85,7 @@ class DynamicUIAgent:
         self.agent_executor = AgentExecutor(
             agent=agent,
             tools=self.tools,
-            verbose=True,
+            verbose=self.verbose,
             return_intermediate_steps=True,
             max_iterations=3
         )
@@ -52,11 +94,22 @@ class DynamicUIAgent:
         """
         Generate system prompt based on available tools.
         """
-        tool_descriptions = []
-        for tool in self.tools:
-            tool_descriptions.append(f"- {tool.name}: {tool.description}")
+        cache_key = tuple((tool.name, tool.description) for tool in self.tools)
+        system_prompt = self._sysprompt_cache.get(cache_key)
+        if system_prompt is None:
+            system_prompt = self._build_system_prompt(cache_key)
+            if len(self._sysprompt_cache) >= SYSPROMPT_CACHE_SIZE:
+                # Evict the oldest entry
+                del self._sysprompt_cache[next(iter(self._sysprompt_cache))]
+            self._sysprompt_cache[cache_key] = system_prompt
+        return system_prompt
 
-        available_tools = "\\n".join(tool_descriptions)
+    @staticmethod
+    def _build_system_prompt(tool_specs: Tuple[Tuple[str, str], ...]) -> str:
+        """
+        Render the system prompt for the given (name, description) pairs.
+        """
+        available_tools = "\n".join(f"- {name}: {description}" for name, description in tool_specs)
 
         return f"""You are a UI Component Selection Agent. Your job is to analyze a user query and corresponding answer, then select the most appropriate UI component to render the response.
 
@@ -88,7 +141,7 @@ Always call exactly one tool to create the appropriate component."""
         from langchain.tools import Tool
 
         def fallback_info_card(title: str, content: str, **kwargs) -> str:
-            return json.dumps({
+            return orjson.dumps({
                 "component": {
                     "type": "info_card",
                     "title": title,
@@ -96,7 +149,7 @@ Always call exactly one tool to create the appropriate component."""
                     "variant": "default"
                 },
                 "reasoning": "Used fallback info card component"
-            })
+            }).decode()
 
         return Tool(
             name="create_info_card",
@@ -112,8 +165,34 @@ Always call exactly one tool to create the appropriate component."""
             if not self.agent_executor:
                 return self._fallback_info_card(answer, "Agent not initialized")
 
-            # Prepare input for the agent
-            input_text = f"""
+            # Execute the agent
+            result = self.agent_executor.invoke({"input": self._format_input(query, answer)})
+            return self._parse_result(result, answer)
+
+        except Exception as e:
+            logger.exception("Dynamic UI Agent error")
+            return self._fallback_info_card(answer, f"Error in component selection: {str(e)}")
+
+    async def aselect_component(self, query: str, answer: str) -> Dict[str, Any]:
+        """
+        Async version of select_component.
+        """
+        try:
+            if not self.agent_executor:
+                return self._fallback_info_card(answer, "Agent not initialized")
+
+            result = await self.agent_executor.ainvoke({"input": self._format_input(query, answer)})
+            return self._parse_result(result, answer)
+
+        except Exception as e:
+            logger.exception("Dynamic UI Agent error")
+            return self._fallback_info_card(answer, f"Error in component selection: {str(e)}")
+
+    def _format_input(self, query: str, answer: str) -> str:
+        """
+        Prepare input for the agent.
+        """
+        return f"""
 User Query: "{query}"
 
 Generated Answer: "{answer}"
@@ -121,39 +200,39 @@ Generated Answer: "{answer}"
 Please select the most appropriate UI component and configure it with the relevant data from the answer.
 """
 
-            # Execute the agent
-            result = self.agent_executor.invoke({"input": input_text})
-            
-            # Parse the result
-            if result and "output" in result:
+    def _parse_result(self, result: Dict[str, Any], answer: str) -> Dict[str, Any]:
+        """
+        Turn the agent executor output into a component and reasoning.
+        """
+        if result and "output" in result:
+            output = result["output"]
+
+            # The model often wraps its JSON in prose or code fences, so parse
+            # the outermost {...} slice rather than the whole text
+            start = output.find("{")
+            end = output.rfind("}")
+            if start != -1 and end > start:
                 try:
-                    # Try to parse JSON response
-                    response_data = json.loads(result["output"])
+                    response_data = orjson.loads(output[start:end + 1])
+                except orjson.JSONDecodeError:
+                    pass
+                else:
                     return {
                         "component": response_data.get("component", {}),
                         "reasoning": response_data.get("reasoning", "Component selected by agent")
                     }
-                except json.JSONDecodeError:
-                    # If not JSON, treat as reasoning text
-                    return self._fallback_info_card(answer, result["output"])
-            
-            return self._fallback_info_card(answer, "No component selected")
 
-        except Exception as e:
-            print(f"Dynamic UI Agent error: {e}")
-            return self._fallback_info_card(answer, f"Error in component selection: {str(e)}")
+            # If not JSON, treat as reasoning text
+            return self._fallback_info_card(answer, output)
+
+        return self._fallback_info_card(answer, "No component selected")
 
     def _fallback_info_card(self, content: str, reasoning: str = "Fallback component") -> Dict[str, Any]:
         """
         Create a fallback info card component.
         """
         return {
-            "component": {
-                "type": "info_card",
-                "title": "Response",
-                "content": content,
-                "variant": "default"
-            },
+            "component": {**self._FALLBACK_TEMPLATE, "content": content},
             "reasoning": reasoning
         }
 
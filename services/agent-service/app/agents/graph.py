@@ -1,15 +1,25 @@
-from langgraph.graph import StateGraph, END
-from langchain.schema import BaseMessage, HumanMessage, AIMessage
-from typing import TypedDict, List, Dict, Any, Optional
+from langchain_core.runnables import RunnableLambda
+from typing import TYPE_CHECKING, TypedDict, List, Dict, Any, Optional, Tuple
 from pydantic import BaseModel
+import asyncio
 import os
-from langchain_google_genai import ChatGoogleGenerativeAI
 
 from .answer_agent import AnswerAgent
 from .ui_agent import UIAgent
 from .dynamic_ui_agent import DynamicUIAgent
 from .router_agent import RouterAgent
-from schemas.components import AgentResponse
+from .response_cache import CacheKey, ResponseCache
+from .batch_processor import BatchProcessor
+from schemas.components import AgentResponse, COMPONENT_ADAPTER, ComponentType
+
+if TYPE_CHECKING:
+    from langgraph.graph import StateGraph
+
+# Characters of streamed answer needed before routing can start alongside generation
+ROUTING_PREFIX_CHARS = 200
+
+# Component types with a schema model in schemas.components
+BUILTIN_COMPONENT_TYPES = frozenset(component_type.value for component_type in ComponentType)
 
 
 class GraphState(TypedDict):
@@ -18,14 +28,25 @@ class GraphState(TypedDict):
     answer: str
     component: Optional[Dict[str, Any]]
     reasoning: str
-    messages: List[BaseMessage]
     error: Optional[str]
     selected_category: Optional[str]
+    # LLM routing started on the streamed answer prefix (async path only)
+    prefix_category: Optional[str]
     available_schemas: Optional[List[Dict[str, Any]]]
+    # Digest of the request's schemas, from its response cache key
+    schemas_digest: bytes
+    # Identifies the routed schema subset for the dynamic UI agent's executor cache
+    tools_key: Optional[Tuple[bytes, str]]
+    tool_results: Optional[Dict[str, Any]]
 
 
 class MultiAgentGraph:
-    def __init__(self, google_api_key: Optional[str] = None):
+    def __init__(
+        self,
+        google_api_key: Optional[str] = None,
+        cache_size: int = 1024,
+        max_concurrency: int = 10,
+    ):
         if not google_api_key:
             google_api_key = os.getenv("GOOGLE_API_KEY")
 
@@ -34,8 +55,18 @@ class MultiAgentGraph:
                 "Google API key is required. Set GOOGLE_API_KEY environment variable."
             )
 
+        # Imported here rather than at module level: the Gemini SDK and
+        # langgraph dominate cold-start time, and nothing needs them until
+        # a graph is actually built
+        from langchain_google_genai import ChatGoogleGenerativeAI
+
+        # A single client serves every agent: bind_tools wraps this same model,
+        # so its channels (gRPC for sync calls, grpc_asyncio for async ones by
+        # default) are shared instead of opened per agent
         self.llm = ChatGoogleGenerativeAI(
-            model="gemini-2.5-flash", temperature=0.7, google_api_key=google_api_key
+            model="gemini-2.5-flash",
+            temperature=0.7,
+            google_api_key=google_api_key,
         )
 
         self.answer_agent = AnswerAgent(self.llm)
@@ -43,14 +74,34 @@ class MultiAgentGraph:
         self.ui_agent = UIAgent(self.llm)  # Keep as fallback
         self.dynamic_ui_agent = DynamicUIAgent(self.llm)
 
+        # Identical requests are answered from here without running the agents
+        self.response_cache = ResponseCache(maxsize=cache_size)
+
+        # Async queries arriving together are batched and run concurrently,
+        # capped so bursts stay under the Gemini rate limit
+        self.max_concurrency = max_concurrency
+        self._query_semaphore: Optional[asyncio.Semaphore] = None
+        self._semaphore_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._query_batcher = BatchProcessor(
+            self._arun_query_batch, max_batch=16, max_wait_ms=10
+        )
+
         self.graph = self._build_graph()
 
-    def _build_graph(self) -> StateGraph:
+    def _build_graph(self) -> "StateGraph":
+        from langgraph.graph import StateGraph, END
+
         workflow = StateGraph(GraphState)
 
-        workflow.add_node("answer_agent", self._answer_node)
-        workflow.add_node("router_agent", self._router_node)
-        workflow.add_node("ui_agent", self._ui_node)
+        workflow.add_node(
+            "answer_agent", RunnableLambda(self._answer_node, afunc=self._aanswer_node)
+        )
+        workflow.add_node(
+            "router_agent", RunnableLambda(self._router_node, afunc=self._arouter_node)
+        )
+        workflow.add_node(
+            "ui_agent", RunnableLambda(self._ui_node, afunc=self._aui_node)
+        )
         workflow.add_node("finalize", self._finalize_node)
 
         workflow.set_entry_point("answer_agent")
@@ -67,11 +118,12 @@ class MultiAgentGraph:
             query = state["query"]
             context = state.get("context", "")
 
-            answer = self.answer_agent.generate_answer(query, context)
+            answer, tool_results = self.answer_agent.generate_answer_with_tool_results(
+                query, context
+            )
 
             state["answer"] = answer
-            state["messages"].append(HumanMessage(content=query))
-            state["messages"].append(AIMessage(content=answer))
+            state["tool_results"] = tool_results
 
         except Exception as e:
             state["error"] = f"Answer Agent Error: {str(e)}"
@@ -81,6 +133,78 @@ class MultiAgentGraph:
 
         return state
 
+    async def _aanswer_node(self, state: GraphState) -> GraphState:
+        route_task = None
+        try:
+            query = state["query"]
+            context = state.get("context", "")
+            available_schemas = state.get("available_schemas", [])
+
+            if self.answer_agent._should_use_weather_tool(query):
+                # Tool answers arrive whole and carry structured data for the UI
+                (
+                    answer,
+                    tool_results,
+                ) = await self.answer_agent.agenerate_answer_with_tool_results(
+                    query, context
+                )
+            else:
+                chunks: List[str] = []
+                streamed_chars = 0
+                prefix_checked = False
+                try:
+                    async for chunk in self.answer_agent.astream_answer(query, context):
+                        chunks.append(chunk)
+                        streamed_chars += len(chunk)
+
+                        # Start the LLM routing fallback on the answer prefix so it
+                        # overlaps with generation; rules still see the full answer.
+                        # A rule hit on the prefix is also one on the full answer,
+                        # so the LLM router is not needed then
+                        if not prefix_checked and streamed_chars >= ROUTING_PREFIX_CHARS:
+                            prefix_checked = True
+                            prefix = "".join(chunks)
+                            if self.router_agent.route_by_rules(query, prefix) is None:
+                                route_task = asyncio.create_task(
+                                    self.router_agent.aroute_by_llm(
+                                        query, prefix, available_schemas
+                                    )
+                                )
+
+                    answer = self.answer_agent.parser.parse("".join(chunks))
+
+                    # Rules matched on the rest of the answer: the router node
+                    # uses them, so stop waiting on the LLM call
+                    if route_task is not None and self.router_agent.route_by_rules(
+                        query, answer
+                    ):
+                        route_task.cancel()
+                        route_task = None
+                except Exception:
+                    # Same single retry as agenerate_answer, without streaming;
+                    # the partial answer and anything routed on it are dropped
+                    if route_task is not None:
+                        route_task.cancel()
+                        route_task = None
+                    answer = await self.answer_agent._afallback_answer(query, context)
+                tool_results = {}
+
+            state["answer"] = answer
+            state["tool_results"] = tool_results
+
+            if route_task is not None:
+                state["prefix_category"] = await route_task
+
+        except Exception as e:
+            if route_task is not None:
+                route_task.cancel()
+            state["error"] = f"Answer Agent Error: {str(e)}"
+            state["answer"] = (
+                "I apologize, but I encountered an error while processing your query."
+            )
+
+        return state
+
     def _router_node(self, state: GraphState) -> GraphState:
         try:
             query = state["query"]
@@ -99,6 +223,8 @@ class MultiAgentGraph:
                 if available_schemas:
                     filtered_schemas = self.router_agent.get_category_schemas(selected_category, available_schemas)
                     state["available_schemas"] = filtered_schemas
+                    # The subset follows from the request's schemas and the category
+                    state["tools_key"] = (state["schemas_digest"], selected_category)
 
         except Exception as e:
             state["error"] = f"Router Agent Error: {str(e)}"
@@ -106,21 +232,69 @@ class MultiAgentGraph:
 
         return state
 
+    async def _arouter_node(self, state: GraphState) -> GraphState:
+        try:
+            query = state["query"]
+            answer = state["answer"]
+            available_schemas = state.get("available_schemas", [])
+
+            if state.get("error"):
+                state["selected_category"] = "content"
+            else:
+                prefix_category = state.get("prefix_category")
+                if prefix_category is None:
+                    selected_category = await self.router_agent.aroute_query(
+                        query, answer, available_schemas
+                    )
+                else:
+                    # Rules run on the full answer; the LLM result from the
+                    # prefix only stands in when none of them match
+                    selected_category = (
+                        self.router_agent.route_by_rules(query, answer) or prefix_category
+                    )
+                state["selected_category"] = selected_category
+
+                if available_schemas:
+                    filtered_schemas = self.router_agent.get_category_schemas(selected_category, available_schemas)
+                    state["available_schemas"] = filtered_schemas
+                    # The subset follows from the request's schemas and the category
+                    state["tools_key"] = (state["schemas_digest"], selected_category)
+
+        except Exception as e:
+            state["error"] = f"Router Agent Error: {str(e)}"
+            state["selected_category"] = "content"
+
+        return state
+
     def _ui_node(self, state: GraphState) -> GraphState:
         try:
             query = state["query"]
             answer = state["answer"]
             available_schemas = state.get("available_schemas", [])
 
+            weather_data = (state.get("tool_results") or {}).get("weather")
+
             if state.get("error"):
                 ui_result = self.dynamic_ui_agent._fallback_info_card(
                     answer, "Error occurred in previous step"
                 )
+            elif weather_data:
+                # The answer agent already fetched the weather; no LLM needed
+                ui_result = {
+                    # Produced by our own weather tool, so skip re-validation
+                    "component": self.ui_agent.create_component(
+                        self.ui_agent.weather_tool.name, weather_data, validate=False
+                    ),
+                    "reasoning": "Weather intent detected upstream; component built deterministically.",
+                }
             else:
                 # Initialize dynamic UI agent with filtered schemas
                 if available_schemas:
-                    self.dynamic_ui_agent.initialize_tools(available_schemas)
+                    self.dynamic_ui_agent.initialize_tools(
+                        available_schemas, cache_key=state.get("tools_key")
+                    )
                     ui_result = self.dynamic_ui_agent.select_component(query, answer)
+                    ui_result["component"] = self._check_component(ui_result["component"])
                 else:
                     # Fallback to original UI agent if no schemas provided
                     ui_result = self.ui_agent.select_component(query, answer)
@@ -138,47 +312,234 @@ class MultiAgentGraph:
 
         return state
 
+    async def _aui_node(self, state: GraphState) -> GraphState:
+        try:
+            query = state["query"]
+            answer = state["answer"]
+            available_schemas = state.get("available_schemas", [])
+
+            weather_data = (state.get("tool_results") or {}).get("weather")
+
+            if state.get("error"):
+                ui_result = self.dynamic_ui_agent._fallback_info_card(
+                    answer, "Error occurred in previous step"
+                )
+            elif weather_data:
+                # The answer agent already fetched the weather; no LLM needed
+                ui_result = {
+                    # Produced by our own weather tool, so skip re-validation
+                    "component": self.ui_agent.create_component(
+                        self.ui_agent.weather_tool.name, weather_data, validate=False
+                    ),
+                    "reasoning": "Weather intent detected upstream; component built deterministically.",
+                }
+            else:
+                # Initialize dynamic UI agent with filtered schemas
+                if available_schemas:
+                    self.dynamic_ui_agent.initialize_tools(
+                        available_schemas, cache_key=state.get("tools_key")
+                    )
+                    ui_result = await self.dynamic_ui_agent.aselect_component(
+                        query, answer
+                    )
+                    ui_result["component"] = self._check_component(ui_result["component"])
+                else:
+                    # Fallback to original UI agent if no schemas provided
+                    ui_result = await self.ui_agent.aselect_component(query, answer)
+
+            state["component"] = ui_result["component"]
+            state["reasoning"] = ui_result["reasoning"]
+
+        except Exception as e:
+            state["error"] = f"UI Agent Error: {str(e)}"
+            fallback_result = self.dynamic_ui_agent._fallback_info_card(
+                state["answer"], f"UI selection failed: {str(e)}"
+            )
+            state["component"] = fallback_result["component"]
+            state["reasoning"] = fallback_result["reasoning"]
+
+        return state
+
+    @staticmethod
+    def _check_component(component: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """
+        Validate a dynamic UI agent component whose type is a built-in one, as
+        its fields come straight from the LLM's tool call. Components of
+        client-defined types are passed through as produced.
+        """
+        if component and component.get("type") in BUILTIN_COMPONENT_TYPES:
+            return COMPONENT_ADAPTER.validate_python(component).model_dump(mode="json")
+        return component
+
     def _finalize_node(self, state: GraphState) -> GraphState:
         return state
 
     def process_query(self, query: str, context: str = "", schemas: List[Dict[str, Any]] = None) -> AgentResponse:
+        cache_key = ResponseCache.make_key(query, context, schemas)
+        cached = self.response_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
         initial_state = GraphState(
             query=query,
             context=context,
             answer="",
             component=None,
             reasoning="",
-            messages=[],
             error=None,
             selected_category=None,
+            prefix_category=None,
             available_schemas=schemas or [],
+            schemas_digest=cache_key[2],
+            tools_key=None,
+            tool_results=None,
         )
 
         result = self.graph.invoke(initial_state)
 
-        return AgentResponse(
+        response = AgentResponse(
             answer=result["answer"],
             component=result["component"],
             reasoning=result.get("reasoning", ""),
         )
 
-    async def aprocess_query(self, query: str, context: str = "", schemas: List[Dict[str, Any]] = None) -> AgentResponse:
+        # Failed runs fall back to placeholder answers, which must not be reused
+        if not result.get("error"):
+            self.response_cache.put(cache_key, response)
+
+        return response
+
+    def lookup_cached_response(
+        self, query: str, context: str = "", schemas: List[Dict[str, Any]] = None
+    ) -> Tuple[CacheKey, Optional[AgentResponse]]:
+        """
+        Return the request's cache key and its cached response, if any, without
+        running it. Pass the key on to aprocess_query on a miss.
+        """
+        cache_key = ResponseCache.make_key(query, context, schemas)
+        return cache_key, self.response_cache.get(cache_key)
+
+    async def aprocess_query(
+        self,
+        query: str,
+        context: str = "",
+        schemas: List[Dict[str, Any]] = None,
+        cache_key: Optional[CacheKey] = None,
+    ) -> AgentResponse:
+        if cache_key is None:
+            cache_key = ResponseCache.make_key(query, context, schemas)
+        cached = self.response_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        return await self._query_batcher.submit((query, context, schemas, cache_key))
+
+    async def aprocess_query_batch(
+        self,
+        queries: List[str],
+        contexts: Optional[List[str]] = None,
+        schemas: List[Dict[str, Any]] = None,
+    ) -> List[AgentResponse]:
+        """
+        Process several queries against the same schemas; they are submitted
+        together, so they land in the same batch window.
+        """
+        contexts = contexts or [""] * len(queries)
+        return await asyncio.gather(
+            *(
+                self.aprocess_query(query, context, schemas)
+                for query, context in zip(queries, contexts)
+            )
+        )
+
+    async def awarmup(self, schemas: List[Dict[str, Any]]):
+        """
+        Prepare for the first real query: build the dynamic UI executor for
+        each category of the default schemas, under the key requests sending
+        those schemas look up, and send one tiny request that opens the async
+        gRPC channel. That request is billed like any other.
+        """
+        schemas_digest = ResponseCache.make_key("", "", schemas)[2]
+        categories = dict.fromkeys(schema.get("category", "general") for schema in schemas)
+        for category in categories:
+            self.dynamic_ui_agent.initialize_tools(
+                self.router_agent.get_category_schemas(category, schemas),
+                cache_key=(schemas_digest, category),
+            )
+        await self.llm.ainvoke("ping")
+
+    def _concurrency_limit(self) -> asyncio.Semaphore:
+        # A semaphore binds to the loop that first waits on it; rebuild per loop
+        loop = asyncio.get_running_loop()
+        if self._semaphore_loop is not loop:
+            self._semaphore_loop = loop
+            self._query_semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._query_semaphore
+
+    async def _arun_query_batch(self, items: List[tuple]) -> List[Any]:
+        # Identical requests in one window (same cache key, so same query,
+        # context and schemas fingerprint) share a single graph run
+        runs: Dict[Any, asyncio.Future] = {}
+        for query, context, schemas, cache_key in items:
+            if cache_key not in runs:
+                runs[cache_key] = asyncio.ensure_future(
+                    self._arun_query(query, context, schemas, cache_key)
+                )
+
+        results = await asyncio.gather(*runs.values(), return_exceptions=True)
+        results_by_key = dict(zip(runs, results))
+        return [results_by_key[item[3]] for item in items]
+
+    async def _arun_query(
+        self, query: str, context: str, schemas: Optional[List[Dict[str, Any]]], cache_key
+    ) -> AgentResponse:
         initial_state = GraphState(
             query=query,
             context=context,
             answer="",
             component=None,
             reasoning="",
-            messages=[],
             error=None,
             selected_category=None,
+            prefix_category=None,
             available_schemas=schemas or [],
+            schemas_digest=cache_key[2],
+            tools_key=None,
+            tool_results=None,
         )
 
-        result = await self.graph.ainvoke(initial_state)
+        async with self._concurrency_limit():
+            result = await self.graph.ainvoke(initial_state)
 
-        return AgentResponse(
+        response = AgentResponse(
             answer=result["answer"],
             component=result["component"],
             reasoning=result.get("reasoning", ""),
         )
+
+        # Failed runs fall back to placeholder answers, which must not be reused
+        if not result.get("error"):
+            self.response_cache.put(cache_key, response)
+
+        return response
+
+
+# Compiled graphs are reused for the life of the process, one per API key
+_GRAPH_INSTANCES: Dict[str, MultiAgentGraph] = {}
+
+
+def get_agent_graph(google_api_key: Optional[str] = None) -> MultiAgentGraph:
+    """
+    Return the shared MultiAgentGraph for an API key, building it on first use.
+    """
+    google_api_key = google_api_key or os.getenv("GOOGLE_API_KEY")
+    if not google_api_key:
+        raise ValueError(
+            "Google API key is required. Set GOOGLE_API_KEY environment variable."
+        )
+
+    graph = _GRAPH_INSTANCES.get(google_api_key)
+    if graph is None:
+        graph = MultiAgentGraph(google_api_key)
+        _GRAPH_INSTANCES[google_api_key] = graph
+    return graph
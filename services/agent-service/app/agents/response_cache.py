@@ -0,0 +1,55 @@
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+import hashlib
+
+import orjson
+
+from schemas.components import AgentResponse
+
+
+CacheKey = Tuple[str, str, bytes]
+
+
+class ResponseCache:
+    """
+    Exact-match LRU cache of agent responses, keyed on the normalized request.
+    """
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[CacheKey, AgentResponse]" = OrderedDict()
+
+    @staticmethod
+    def make_key(
+        query: str, context: str = "", schemas: Optional[List[Dict[str, Any]]] = None
+    ) -> CacheKey:
+        """
+        Build a hashable key; schemas take part since they decide the component.
+        They are reduced to a digest so keys stay small however large they are.
+        """
+        schemas_key = (
+            hashlib.blake2b(
+                orjson.dumps(schemas, option=orjson.OPT_SORT_KEYS), digest_size=16
+            ).digest()
+            if schemas
+            else b""
+        )
+        return (query.strip().lower(), context, schemas_key)
+
+    def get(self, key: CacheKey) -> Optional[AgentResponse]:
+        response = self._entries.get(key)
+        if response is not None:
+            self._entries.move_to_end(key)
+        return response
+
+    def put(self, key: CacheKey, response: AgentResponse):
+        self._entries[key] = response
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
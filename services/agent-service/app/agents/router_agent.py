@@ -1,32 +1,85 @@
 from langchain.schema import BaseMessage, HumanMessage, AIMessage
-from langchain_google_genai import ChatGoogleGenerativeAI
-from typing import Dict, Any, List, Optional
+from langchain_core.language_models import BaseChatModel
+from types import MappingProxyType
+from typing import Any, ClassVar, Dict, List, Mapping, Optional, Tuple
+import functools
 import json
+import logging
+import re
 
 from schemas.components import ComponentSchema
 
 
+logger = logging.getLogger(__name__)
+
+# Rule-based routing: keyword sets in priority order, with the category each routes to
+_WORD_RE = re.compile(r"\w+")
+_WEATHER_KEYWORDS = frozenset({"weather", "temperature", "humidity", "wind"})
+_CHART_KEYWORDS = frozenset({"chart", "graph", "plot", "visualization", "bar", "line", "pie", "statistics"})
+_TABLE_KEYWORDS = frozenset({"table", "list", "display", "show", "data", "users", "records", "rows", "columns"})
+_INFO_KEYWORDS = frozenset({"explain", "information", "about", "description"})
+_INFO_PHRASES = ("what is", "tell me")
+_ROUTING_RULES = (
+    (_WEATHER_KEYWORDS, "data_display"),  # weather queries are always data_display
+    (_CHART_KEYWORDS, "data_visualization"),
+    (_TABLE_KEYWORDS, "data_display"),
+    (_INFO_KEYWORDS, "content"),
+)
+
+# Every keyword, and its simple plural ("charts", "temperatures"), mapped to
+# its (priority, category): one set intersection with the text's tokens then
+# finds every matching rule
+_KEYWORD_RULES: Dict[str, Tuple[int, str]] = {}
+for _priority, (_keywords, _category) in enumerate(_ROUTING_RULES):
+    for _keyword in _keywords:
+        _KEYWORD_RULES.setdefault(_keyword, (_priority, _category))
+        _KEYWORD_RULES.setdefault(f"{_keyword}s", (_priority, _category))
+
+# Answers shorter than this give the LLM router nothing to go on
+MIN_LLM_ROUTING_CHARS = 40
+
+# Short forms the LLM may answer with instead of a canonical category name
+_CATEGORY_ALIASES = {
+    "visualization": "data_visualization",
+    "viz": "data_visualization",
+    "chart": "data_visualization",
+    "graph": "data_visualization",
+    "display": "data_display",
+    "table": "data_display",
+    "data": "data_display",
+    "info": "content",
+    "text": "content",
+    "misc": "general",
+    "other": "general",
+}
+
+
 class RouterAgent:
-    def __init__(self, llm: ChatGoogleGenerativeAI):
+    # Static, so shared by every router rather than rebuilt per instance
+    CATEGORIES: ClassVar[Mapping[str, Mapping[str, Any]]] = MappingProxyType({
+        "data_display": MappingProxyType({
+            "description": "Components for displaying data in tables, lists, cards, etc.",
+            "keywords": frozenset({"table", "list", "display", "show", "view", "data", "information", "users", "records", "items"})
+        }),
+        "data_visualization": MappingProxyType({
+            "description": "Components for charts, graphs, and visual data representation",
+            "keywords": frozenset({"chart", "graph", "visualization", "plot", "bar", "line", "pie", "statistics", "analytics", "metrics"})
+        }),
+        "content": MappingProxyType({
+            "description": "Components for general content display, information cards, text",
+            "keywords": frozenset({"info", "content", "text", "description", "explanation", "about", "details", "summary"})
+        }),
+        "general": MappingProxyType({
+            "description": "General purpose components that don't fit other categories",
+            "keywords": frozenset({"general", "misc", "other", "custom", "generic"})
+        })
+    })
+    CATEGORY_ALIASES: ClassVar[Mapping[str, str]] = MappingProxyType(
+        {cat: cat for cat in CATEGORIES} | _CATEGORY_ALIASES
+    )
+
+    def __init__(self, llm: BaseChatModel):
         self.llm = llm
-        self.categories = {
-            "data_display": {
-                "description": "Components for displaying data in tables, lists, cards, etc.",
-                "keywords": ["table", "list", "display", "show", "view", "data", "information", "users", "records", "items"]
-            },
-            "data_visualization": {
-                "description": "Components for charts, graphs, and visual data representation",
-                "keywords": ["chart", "graph", "visualization", "plot", "bar", "line", "pie", "statistics", "analytics", "metrics"]
-            },
-            "content": {
-                "description": "Components for general content display, information cards, text",
-                "keywords": ["info", "content", "text", "description", "explanation", "about", "details", "summary"]
-            },
-            "general": {
-                "description": "General purpose components that don't fit other categories",
-                "keywords": ["general", "misc", "other", "custom", "generic"]
-            }
-        }
 
     def route_query(self, query: str, answer: str, available_schemas: List[Dict[str, Any]]) -> str:
         """
@@ -34,42 +87,78 @@ class RouterAgent:
         Returns the category name that should handle this request.
         """
         try:
-            # First, try rule-based routing for common patterns
-            category = self._rule_based_routing(query, answer)
+            # First, try rule-based routing for common patterns; the text is
+            # joined and lowered once per routing call
+            category = self._rule_based_routing(f"{query} {answer}".lower())
             if category:
                 return category
 
+            if self._skip_llm_routing(answer, available_schemas):
+                return "content"
+
             # Fallback to LLM-based routing for complex cases
             return self._llm_based_routing(query, answer, available_schemas)
         
-        except Exception as e:
-            print(f"Router error: {e}")
+        except Exception:
+            logger.exception("Router error")
             # Default fallback
             return "content"
 
-    def _rule_based_routing(self, query: str, answer: str) -> Optional[str]:
+    async def aroute_query(self, query: str, answer: str, available_schemas: List[Dict[str, Any]]) -> str:
         """
-        Use simple keyword matching to route common queries quickly.
+        Async version of route_query; the LLM fallback does not block the event loop.
         """
-        combined_text = f"{query} {answer}".lower()
-        
-        # Weather queries are always data_display
-        if any(word in combined_text for word in ["weather", "temperature", "humidity", "wind"]):
-            return "data_display"
+        try:
+            category = self.route_by_rules(query, answer)
+            if category:
+                return category
+
+            return await self.aroute_by_llm(query, answer, available_schemas)
         
-        # Chart/visualization keywords
-        chart_keywords = ["chart", "graph", "plot", "visualization", "bar", "line", "pie", "statistics"]
-        if any(word in combined_text for word in chart_keywords):
-            return "data_visualization"
+        except Exception:
+            logger.exception("Router error")
+            return "content"
+
+    def route_by_rules(self, query: str, answer: str) -> Optional[str]:
+        """
+        The keyword/phrase half of routing; None when no rule matches.
+        """
+        return self._rule_based_routing(f"{query} {answer}".lower())
+
+    async def aroute_by_llm(self, query: str, answer: str, available_schemas: List[Dict[str, Any]]) -> str:
+        """
+        The LLM half of routing, used when no rule matches. Safe to start on a
+        partial answer, since it only stands in for rules that found nothing.
+        """
+        try:
+            if self._skip_llm_routing(answer, available_schemas):
+                return "content"
+
+            return await self._allm_based_routing(query, answer, available_schemas)
         
-        # Table/data display keywords
-        table_keywords = ["table", "list", "display", "show", "data", "users", "records", "rows", "columns"]
-        if any(word in combined_text for word in table_keywords):
-            return "data_display"
+        except Exception:
+            logger.exception("Router error")
+            return "content"
+
+    def _skip_llm_routing(self, answer: str, available_schemas: List[Dict[str, Any]]) -> bool:
+        """
+        The category only narrows the schemas handed to the UI agent, so without
+        schemas, or with too short an answer, an LLM call adds nothing.
+        """
+        return not available_schemas or len(answer) < MIN_LLM_ROUTING_CHARS
+
+    def _rule_based_routing(self, combined_lower: str) -> Optional[str]:
+        """
+        Use simple keyword matching to route common queries quickly.
+        Takes the query and answer already joined and lowercased.
+        """
+        matched = _KEYWORD_RULES.keys() & set(_WORD_RE.findall(combined_lower))
+        if matched:
+            # Highest-priority rule wins
+            return min(_KEYWORD_RULES[keyword] for keyword in matched)[1]
         
-        # Information/content keywords
-        info_keywords = ["explain", "information", "about", "description", "what is", "tell me"]
-        if any(word in combined_text for word in info_keywords):
+        # Information/content phrases
+        if any(phrase in combined_lower for phrase in _INFO_PHRASES):
             return "content"
         
         return None
@@ -78,23 +167,56 @@ class RouterAgent:
         """
         Use LLM to determine the best category when rule-based routing fails.
         """
-        # Get available categories from schemas
-        schema_categories = set()
-        for schema in available_schemas:
-            if "category" in schema:
-                schema_categories.add(schema["category"])
+        try:
+            messages = [HumanMessage(content=self._routing_prompt(query, answer, available_schemas))]
+            response = self.llm.invoke(messages)
+            return self._parse_category(response.content)
+        except Exception:
+            logger.exception("LLM routing error")
         
-        # Use predefined categories as fallback
-        categories_info = []
-        for cat, info in self.categories.items():
-            if cat in schema_categories or len(schema_categories) == 0:
-                categories_info.append(f"- {cat}: {info['description']}")
+        # Ultimate fallback
+        return "content"
+
+    async def _allm_based_routing(self, query: str, answer: str, available_schemas: List[Dict[str, Any]]) -> str:
+        """
+        Async version of _llm_based_routing.
+        """
+        try:
+            messages = [HumanMessage(content=self._routing_prompt(query, answer, available_schemas))]
+            response = await self.llm.ainvoke(messages)
+            return self._parse_category(response.content)
+        except Exception:
+            logger.exception("LLM routing error")
         
-        prompt = f"""
+        return "content"
+
+    @staticmethod
+    @functools.lru_cache(maxsize=64)
+    def _categories_info(schema_categories: frozenset) -> str:
+        """
+        List the categories offered to the LLM; all of them if the schemas name none.
+        Memoized per set of schema categories.
+        """
+        return "\n".join(
+            f"- {cat}: {info['description']}"
+            for cat, info in RouterAgent.CATEGORIES.items()
+            if cat in schema_categories or len(schema_categories) == 0
+        )
+
+    def _routing_prompt(self, query: str, answer: str, available_schemas: List[Dict[str, Any]]) -> str:
+        """
+        Build the routing prompt for the categories present in the schemas.
+        """
+        schema_categories = frozenset(
+            schema["category"] for schema in available_schemas if "category" in schema
+        )
+        categories_info = self._categories_info(schema_categories)
+        
+        return f"""
 You are a component category router. Your job is to analyze a user query and corresponding answer, then select the most appropriate UI component category.
 
 Available categories:
-{chr(10).join(categories_info)}
+{categories_info}
 
 User Query: "{query}"
 Generated Answer: "{answer}"
@@ -104,27 +226,18 @@ Based on the query and answer, which category would be most appropriate for rend
 Respond with ONLY the category name (e.g., "data_visualization", "data_display", "content", or "general").
 """
 
-        try:
-            messages = [HumanMessage(content=prompt)]
-            response = self.llm.invoke(messages)
-            
-            # Extract category from response
-            category = response.content.strip().lower()
-            
-            # Validate that it's a known category
-            if category in self.categories:
-                return category
-            
-            # Try to find partial match
-            for cat in self.categories.keys():
-                if cat in category or category in cat:
-                    return cat
-                    
-        except Exception as e:
-            print(f"LLM routing error: {e}")
+    def _parse_category(self, content: str) -> str:
+        """
+        Map the LLM's reply onto a known category.
+        """
+        reply = content.strip().lower().strip("\"'`.* ")
         
-        # Ultimate fallback
-        return "content"
+        # Exact name first ("data visualization" counts), then the reply's first word
+        category = self.CATEGORY_ALIASES.get(reply.replace(" ", "_").replace("-", "_"))
+        if category is None and reply:
+            category = self.CATEGORY_ALIASES.get(reply.split()[0].strip("\"'`.,:*"))
+        
+        return category or "content"
 
     def get_category_schemas(self, category: str, all_schemas: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """
@@ -139,7 +252,7 @@ Respond with ONLY the category name (e.g., "data_visualization", "data_display",
         """
         Generate an explanation for why a particular category was selected.
         """
-        category_info = self.categories.get(selected_category, {})
+        category_info = self.CATEGORIES.get(selected_category, {})
         description = category_info.get("description", "Unknown category")
         
         return f"Routed to '{selected_category}' category: {description}"
\ No newline at end of file
@@ -1,14 +1,17 @@
-from langchain.prompts import PromptTemplate
 from langchain.schema import BaseOutputParser
 from langchain.tools import BaseTool
 from langchain_core.language_models import BaseChatModel
-from langchain_core.messages import HumanMessage, AIMessage, ToolMessage
-from langgraph.graph import StateGraph, END
-from langgraph.prebuilt import ToolNode
-from typing import Dict, Any, List, TypedDict, Annotated
+from langchain_core.messages import HumanMessage, AIMessage, ToolMessage, SystemMessage
+from langchain_core.runnables import RunnableConfig, RunnableLambda
+from pydantic import TypeAdapter
+from typing import TYPE_CHECKING, Dict, Any, List, Optional, TypedDict, Annotated
+import functools
+import inspect
+import math
 import operator
-import json
 import re
+
+import orjson
 from schemas.components import (
     WeatherCardSchema, 
     ChartCardSchema, 
@@ -16,10 +19,42 @@ from schemas.components import (
     InfoCardSchema,
     ChartType,
     ChartDataPoint,
-    TableColumn,
-    TableRow
+    TableColumn
 )
 
+if TYPE_CHECKING:
+    from langgraph.graph import StateGraph
+
+
+# Whole-list validators, so pydantic-core checks each list in a single pass
+_CHART_DATA_ADAPTER = TypeAdapter(List[ChartDataPoint])
+_TABLE_COLUMNS_ADAPTER = TypeAdapter(List[TableColumn])
+
+# Leading number in values like "20°C", "36%", "12 km/h"
+_NUMBER_RE = re.compile(r'-?\d+\.?\d*')
+
+# Query phrasings that ask for one component outright, so the LLM's choice is
+# skipped; words that also turn up in passing ("trend", "periodic table",
+# "temperature") are left to the LLM
+_WEATHER_HINT_RE = re.compile(r"\b(?:weather|forecast)", re.IGNORECASE)
+_CHART_HINT_RE = re.compile(r"\b(?:chart|bar graph|line graph|histogram)s?\b", re.IGNORECASE)
+_TABLE_HINT_RE = re.compile(r"\b(?:(?:in|as|into) a table|tabular)\b", re.IGNORECASE)
+
+# Kept byte-identical across requests so providers can cache the prompt prefix.
+# Tool names and descriptions already reach the model through bind_tools.
+UI_SYSTEM_PROMPT = "You are a UI Component Agent. Select the most appropriate tool for the query and answer."
+
+FALLBACK_PROMPT_TEMPLATE = """Based on this query and answer, provide a brief reasoning for why this response is appropriate:
+
+Query: {query}
+Answer: {answer}
+
+Reasoning:"""
+
+# The template is static, so it is split once and joined per call
+_FALLBACK_PREFIX, _FALLBACK_REST = FALLBACK_PROMPT_TEMPLATE.split("{query}")
+_FALLBACK_MIDDLE, _FALLBACK_SUFFIX = _FALLBACK_REST.split("{answer}")
+
 
 class UIAgentState(TypedDict):
     messages: Annotated[List[Any], operator.add]
@@ -27,8 +62,37 @@ class UIAgentState(TypedDict):
     answer: str
     component: Dict[str, Any]
     reasoning: str
+    forced_tool: Optional[str]
+    last_tool_result: Optional[Dict[str, Any]]
+
+
+# Graph node callables are free functions with their dependencies bound via
+# functools.partial in _build_graph, keeping attribute lookups off the per-step path
+def _call_model_impl(
+    state: UIAgentState, llm: Any, forced_llms: Dict[str, Any]
+) -> Dict[str, Any]:
+    """Call the model with current state, forcing the classified tool if any"""
+    llm = forced_llms.get(state.get("forced_tool"), llm)
+    return {"messages": [llm.invoke(state["messages"])]}
+
+
+async def _acall_model_impl(
+    state: UIAgentState, llm: Any, forced_llms: Dict[str, Any]
+) -> Dict[str, Any]:
+    """Async version of _call_model_impl"""
+    llm = forced_llms.get(state.get("forced_tool"), llm)
+    return {"messages": [await llm.ainvoke(state["messages"])]}
 
 
+def _should_continue(state: Dict[str, Any]) -> str:
+    """Determine if we should continue with tool calls or end"""
+    last_message = state["messages"][-1]
+    
+    # If there are tool calls, continue to tools
+    if getattr(last_message, "tool_calls", None):
+        return "continue"
+    
+    return "end"
 
 
 class WeatherCardTool(BaseTool):
@@ -53,22 +117,33 @@ class WeatherCardTool(BaseTool):
         if isinstance(value, (int, float)):
             return int(value) if is_int else float(value)
         
+        if isinstance(value, str):
+            # Plain numeric strings like "21.5" skip the regex
+            try:
+                parsed = float(value)
+            except ValueError:
+                pass
+            else:
+                if math.isfinite(parsed):
+                    return int(parsed) if is_int else parsed
+        
         # Extract numbers from strings like "20°C", "36%", "12 km/h"
-        import re
-        numbers = re.findall(r'-?\d+\.?\d*', str(value))
-        if numbers:
-            parsed = float(numbers[0])
+        match = _NUMBER_RE.search(str(value))
+        if match:
+            parsed = float(match.group(0))
             return int(parsed) if is_int else parsed
         return None
     
-    def _run(self, location: str, temperature, condition: str, 
-             humidity=None, wind_speed=None, icon: str = None) -> str:
+    def _create_component(self, location: str, temperature, condition: str, 
+                          humidity=None, wind_speed=None, icon: str = None,
+                          validate: bool = True) -> WeatherCardSchema:
         # Parse numeric values from potentially string inputs
         parsed_temp = self._parse_number(temperature)
         parsed_humidity = self._parse_number(humidity, is_int=True)
         parsed_wind = self._parse_number(wind_speed)
         
-        schema = WeatherCardSchema(
+        build = WeatherCardSchema if validate else WeatherCardSchema.model_construct
+        return build(
             location=location,
             temperature=parsed_temp if parsed_temp is not None else 20.0,
             condition=condition,
@@ -76,7 +151,12 @@ class WeatherCardTool(BaseTool):
             wind_speed=parsed_wind,
             icon=icon
         )
-        return json.dumps(schema.model_dump())
+    
+    def _run(self, location: str, temperature, condition: str, 
+             humidity=None, wind_speed=None, icon: str = None) -> str:
+        return self._create_component(
+            location, temperature, condition, humidity, wind_speed, icon
+        ).model_dump_json()
     
     async def _arun(self, location: str, temperature, condition: str, 
                     humidity=None, wind_speed=None, icon: str = None) -> str:
@@ -96,17 +176,32 @@ class ChartCardTool(BaseTool):
     
     Use this tool when the query asks for charts, graphs, or data visualization."""
     
-    def _run(self, title: str, chart_type: str, data: List[dict], 
-             x_axis_label: str = None, y_axis_label: str = None) -> str:
-        chart_data = [ChartDataPoint(**point) for point in data]
-        schema = ChartCardSchema(
+    def _create_component(self, title: str, chart_type: str, data: List[dict], 
+                          x_axis_label: str = None, y_axis_label: str = None,
+                          validate: bool = True) -> ChartCardSchema:
+        if not validate:
+            return ChartCardSchema.model_construct(
+                title=title,
+                chart_type=ChartType(chart_type),
+                data=[ChartDataPoint.model_construct(**point) for point in data],
+                x_axis_label=x_axis_label,
+                y_axis_label=y_axis_label
+            )
+        
+        chart_data = _CHART_DATA_ADAPTER.validate_python(data)
+        return ChartCardSchema(
             title=title,
             chart_type=ChartType(chart_type),
             data=chart_data,
             x_axis_label=x_axis_label,
             y_axis_label=y_axis_label
         )
-        return json.dumps(schema.model_dump())
+    
+    def _run(self, title: str, chart_type: str, data: List[dict], 
+             x_axis_label: str = None, y_axis_label: str = None) -> str:
+        return self._create_component(
+            title, chart_type, data, x_axis_label, y_axis_label
+        ).model_dump_json()
     
     async def _arun(self, title: str, chart_type: str, data: List[dict], 
                     x_axis_label: str = None, y_axis_label: str = None) -> str:
@@ -125,17 +220,27 @@ class DataTableTool(BaseTool):
     
     Use this tool when the query asks for tabular data, lists, or structured information."""
     
-    def _run(self, title: str, columns: List[dict], rows: List[dict], 
-             searchable: bool = True) -> str:
-        table_columns = [TableColumn(**col) for col in columns]
-        table_rows = [TableRow(data=row) for row in rows]
-        schema = DataTableSchema(
+    def _create_component(self, title: str, columns: List[dict], rows: List[dict], 
+                          searchable: bool = True, validate: bool = True) -> DataTableSchema:
+        if not validate:
+            return DataTableSchema.model_construct(
+                title=title,
+                columns=[TableColumn.model_construct(**column) for column in columns],
+                rows=rows,
+                searchable=searchable
+            )
+        
+        table_columns = _TABLE_COLUMNS_ADAPTER.validate_python(columns)
+        return DataTableSchema(
             title=title,
             columns=table_columns,
-            rows=table_rows,
+            rows=rows,
             searchable=searchable
         )
-        return json.dumps(schema.model_dump())
+    
+    def _run(self, title: str, columns: List[dict], rows: List[dict], 
+             searchable: bool = True) -> str:
+        return self._create_component(title, columns, rows, searchable).model_dump_json()
     
     async def _arun(self, title: str, columns: List[dict], rows: List[dict], 
                     searchable: bool = True) -> str:
@@ -154,15 +259,19 @@ class InfoCardTool(BaseTool):
     
     Use this tool for general information, explanations, or when no specific component fits."""
     
-    def _run(self, title: str, content: str, icon: str = None, 
-             variant: str = "default") -> str:
-        schema = InfoCardSchema(
+    def _create_component(self, title: str, content: str, icon: str = None, 
+                          variant: str = "default", validate: bool = True) -> InfoCardSchema:
+        build = InfoCardSchema if validate else InfoCardSchema.model_construct
+        return build(
             title=title,
             content=content,
             icon=icon,
             variant=variant
         )
-        return json.dumps(schema.model_dump())
+    
+    def _run(self, title: str, content: str, icon: str = None, 
+             variant: str = "default") -> str:
+        return self._create_component(title, content, icon, variant).model_dump_json()
     
     async def _arun(self, title: str, content: str, icon: str = None, 
                     variant: str = "default") -> str:
@@ -170,6 +279,16 @@ class InfoCardTool(BaseTool):
 
 
 class UIAgent:
+    # What InfoCardTool would produce for the no-tool fallback, minus content;
+    # copied per use so the fallback skips the schema entirely
+    _FALLBACK_TEMPLATE = {
+        "type": "info_card",
+        "title": "Information",
+        "content": None,
+        "icon": None,
+        "variant": "default",
+    }
+    
     def __init__(self, llm: BaseChatModel):
         self.llm = llm
         
@@ -180,33 +299,62 @@ class UIAgent:
         self.info_tool = InfoCardTool()
         
         self.tools = [self.weather_tool, self.chart_tool, self.table_tool, self.info_tool]
-        self.tool_node = ToolNode(self.tools)
+        
+        # Direct construction, by tool name, for callers that already hold the
+        # arguments; unknown keys are dropped before they reach the schema
+        self._create_fns = {tool.name: tool._create_component for tool in self.tools}
+        self._allowed_keys = {
+            name: frozenset(inspect.signature(create_fn).parameters) - {"validate"}
+            for name, create_fn in self._create_fns.items()
+        }
         
         # Bind tools to LLM
         self.llm_with_tools = self.llm.bind_tools(self.tools)
         
+        # When the query makes the component obvious, the LLM only has to
+        # fill in that one tool's arguments
+        self._component_hints = [
+            (_WEATHER_HINT_RE, self.weather_tool),
+            (_CHART_HINT_RE, self.chart_tool),
+            (_TABLE_HINT_RE, self.table_tool),
+        ]
+        self._forced_llms = {
+            tool.name: self.llm.bind_tools([tool], tool_choice=tool.name)
+            for _, tool in self._component_hints
+        }
+        
         # Build the LangGraph agent
         self.graph = self._build_graph()
         
-        # Fallback for when no tool is used
-        self.fallback_prompt = PromptTemplate(
-            input_variables=["query", "answer"],
-            template="""Based on this query and answer, provide a brief reasoning for why this response is appropriate:
-
-Query: {query}
-Answer: {answer}
-
-Reasoning:"""
-        )
+        # Fallback for when no tool is used, formatted with str.format
+        self.fallback_prompt = FALLBACK_PROMPT_TEMPLATE
     
-    def _build_graph(self) -> StateGraph:
+    def _build_graph(self) -> "StateGraph":
         """Build the LangGraph agent workflow"""
+        # langgraph is slow to import, so it is only loaded once an agent is built
+        from langgraph.graph import StateGraph, END
+        from langgraph.prebuilt import ToolNode
+
+        self.tool_node = ToolNode(self.tools)
         workflow = StateGraph(UIAgentState)
         
         # Add nodes
-        workflow.add_node("agent", self._call_model)
-        workflow.add_node("tools", self.tool_node)
-        workflow.add_node("finalize", self._finalize_response)
+        workflow.add_node(
+            "agent",
+            RunnableLambda(
+                functools.partial(
+                    _call_model_impl, llm=self.llm_with_tools, forced_llms=self._forced_llms
+                ),
+                afunc=functools.partial(
+                    _acall_model_impl, llm=self.llm_with_tools, forced_llms=self._forced_llms
+                ),
+            ),
+        )
+        workflow.add_node("tools", RunnableLambda(self._run_tools, afunc=self._arun_tools))
+        workflow.add_node(
+            "finalize",
+            RunnableLambda(self._finalize_response, afunc=self._afinalize_response),
+        )
         
         # Set the entrypoint
         workflow.set_entry_point("agent")
@@ -214,7 +362,7 @@ Reasoning:"""
         # Add conditional edges
         workflow.add_conditional_edges(
             "agent",
-            self._should_continue,
+            _should_continue,
             {
                 "continue": "tools",
                 "end": "finalize",
@@ -227,82 +375,118 @@ Reasoning:"""
         
         return workflow.compile()
     
-    def _call_model(self, state: UIAgentState) -> Dict[str, Any]:
-        """Call the model with current state"""
-        messages = state["messages"]
-        response = self.llm_with_tools.invoke(messages)
-        return {"messages": [response]}
+    def _classify_component(self, query: str) -> Optional[str]:
+        """Name the one tool the query clearly calls for, or None if unclear"""
+        # The free-form answer mentions too much in passing to force a tool on
+        matches = [tool.name for pattern, tool in self._component_hints if pattern.search(query)]
+        return matches[0] if len(matches) == 1 else None
     
-    def _should_continue(self, state: UIAgentState) -> str:
-        """Determine if we should continue with tool calls or end"""
-        messages = state["messages"]
-        last_message = messages[-1]
-        
-        # If there are tool calls, continue to tools
-        if hasattr(last_message, 'tool_calls') and last_message.tool_calls:
-            return "continue"
-        
-        return "end"
+    def _run_tools(self, state: UIAgentState, config: RunnableConfig) -> Dict[str, Any]:
+        """Run the tool calls and record the component they built"""
+        output = self.tool_node.invoke(state, config)
+        return {**output, "last_tool_result": self._find_tool_component(output["messages"])}
+    
+    async def _arun_tools(self, state: UIAgentState, config: RunnableConfig) -> Dict[str, Any]:
+        """Async version of _run_tools"""
+        output = await self.tool_node.ainvoke(state, config)
+        return {**output, "last_tool_result": self._find_tool_component(output["messages"])}
+    
+    def _find_tool_component(self, messages: List[Any]) -> Optional[Dict[str, Any]]:
+        """Return the component built by the most recent successful tool call, if any"""
+        for message in reversed(messages):
+            # Failed calls carry an error string; successful ones always hold
+            # the JSON from model_dump_json
+            if isinstance(message, ToolMessage) and message.status != "error":
+                return orjson.loads(message.content)
+        return None
+    
+    def _tool_response(self, state: UIAgentState) -> Optional[Dict[str, Any]]:
+        """Component and reasoning from the tools node, scanning messages only if it left none"""
+        component_data = state.get("last_tool_result")
+        if component_data is None:
+            component_data = self._find_tool_component(state["messages"])
+        if component_data is None:
+            return None
+        return {
+            "component": component_data,
+            "reasoning": f"Selected {component_data.get('type', 'component')} based on query content"
+        }
+    
+    def create_component(
+        self, tool_name: str, component_data: Dict[str, Any], validate: bool = True
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Build a component from tool arguments without the LLM; None for an unknown tool.
+        Pass validate=False only for data this service produced itself.
+        """
+        create_fn = self._create_fns.get(tool_name)
+        if create_fn is None:
+            return None
+        allowed_keys = self._allowed_keys[tool_name]
+        schema = create_fn(
+            **{k: v for k, v in component_data.items() if k in allowed_keys},
+            validate=validate
+        )
+        return schema.model_dump(mode="json")
+    
+    def _format_fallback_prompt(self, query: str, answer: str) -> str:
+        """Equivalent to self.fallback_prompt.format(query=query, answer=answer)"""
+        return f"{_FALLBACK_PREFIX}{query}{_FALLBACK_MIDDLE}{answer}{_FALLBACK_SUFFIX}"
     
     def _finalize_response(self, state: UIAgentState) -> Dict[str, Any]:
         """Process the final response and extract component data"""
-        messages = state["messages"]
         query = state["query"]
         answer = state["answer"]
         
-        # Look for tool results in messages
-        for message in reversed(messages):
-            if isinstance(message, ToolMessage):
-                try:
-                    component_data = json.loads(message.content)
-                    reasoning = f"Selected {component_data.get('type', 'component')} based on query content"
-                    return {
-                        "component": component_data,
-                        "reasoning": reasoning
-                    }
-                except json.JSONDecodeError:
-                    continue
+        tool_result = self._tool_response(state)
+        if tool_result is not None:
+            return tool_result
         
         # Fallback if no tool was used - create info card
-        fallback_component = self.info_tool._run(
-            title="Information",
-            content=answer,
-            variant="default"
-        )
+        fallback_component = {**self._FALLBACK_TEMPLATE, "content": answer}
         
         reasoning_response = self.llm.invoke(
-            self.fallback_prompt.format(query=query, answer=answer)
+            self._format_fallback_prompt(query, answer)
         )
         
         return {
-            "component": json.loads(fallback_component),
+            "component": fallback_component,
+            "reasoning": reasoning_response.content.strip()
+        }
+    
+    async def _afinalize_response(self, state: UIAgentState) -> Dict[str, Any]:
+        """Async version of _finalize_response"""
+        query = state["query"]
+        answer = state["answer"]
+        
+        tool_result = self._tool_response(state)
+        if tool_result is not None:
+            return tool_result
+        
+        fallback_component = {**self._FALLBACK_TEMPLATE, "content": answer}
+        
+        reasoning_response = await self.llm.ainvoke(
+            self._format_fallback_prompt(query, answer)
+        )
+        
+        return {
+            "component": fallback_component,
             "reasoning": reasoning_response.content.strip()
         }
     
     def select_component(self, query: str, answer: str) -> Dict[str, Any]:
         """Select and create appropriate UI component"""
-        system_message = """You are a UI Component Agent. Your job is to select the most appropriate UI component for the given query and answer.
-
-Available tools:
-- create_weather_card: For weather information
-- create_chart_card: For data that can be visualized as charts
-- create_data_table: For tabular/structured data
-- create_info_card: For general information
-
-Analyze the query and answer, then use the most appropriate tool to create the UI component.
-If the content is about weather, use create_weather_card.
-If the content can be visualized as data, use create_chart_card.
-If the content is structured/tabular, use create_data_table.
-For general information, use create_info_card."""
-        
         initial_state = {
             "messages": [
-                HumanMessage(content=f"System: {system_message}\n\nUser Query: {query}\nGenerated Answer: {answer}\n\nPlease select and create the appropriate UI component.")
+                SystemMessage(content=UI_SYSTEM_PROMPT),
+                HumanMessage(content=f"User Query: {query}\nGenerated Answer: {answer}\n\nPlease select and create the appropriate UI component.")
             ],
             "query": query,
             "answer": answer,
             "component": {},
-            "reasoning": ""
+            "reasoning": "",
+            "forced_tool": self._classify_component(query),
+            "last_tool_result": None
         }
         
         result = self.graph.invoke(initial_state)
@@ -313,28 +497,17 @@ For general information, use create_info_card."""
     
     async def aselect_component(self, query: str, answer: str) -> Dict[str, Any]:
         """Async version of select_component"""
-        system_message = """You are a UI Component Agent. Your job is to select the most appropriate UI component for the given query and answer.
-
-Available tools:
-- create_weather_card: For weather information
-- create_chart_card: For data that can be visualized as charts
-- create_data_table: For tabular/structured data
-- create_info_card: For general information
-
-Analyze the query and answer, then use the most appropriate tool to create the UI component.
-If the content is about weather, use create_weather_card.
-If the content can be visualized as data, use create_chart_card.
-If the content is structured/tabular, use create_data_table.
-For general information, use create_info_card."""
-        
         initial_state = {
             "messages": [
-                HumanMessage(content=f"System: {system_message}\n\nUser Query: {query}\nGenerated Answer: {answer}\n\nPlease select and create the appropriate UI component.")
+                SystemMessage(content=UI_SYSTEM_PROMPT),
+                HumanMessage(content=f"User Query: {query}\nGenerated Answer: {answer}\n\nPlease select and create the appropriate UI component.")
             ],
             "query": query,
             "answer": answer,
             "component": {},
-            "reasoning": ""
+            "reasoning": "",
+            "forced_tool": self._classify_component(query),
+            "last_tool_result": None
         }
         
         result = await self.graph.ainvoke(initial_state)
@@ -1,33 +1,116 @@
 from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 import asyncio
-import json
 import os
-from typing import List
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional, Union
 from contextlib import asynccontextmanager
 from dotenv import load_dotenv
+import msgspec
+import orjson
 
 # Load environment variables from .env file
 load_dotenv()
 
-from schemas.requests import QueryRequest, QueryResponse
+from schemas.requests import QueryRequest, QueryRequestStruct, QueryResponse
 from schemas.components import AgentResponse
-from agents.graph import MultiAgentGraph
+from agents.graph import get_agent_graph
 
 agent_graph = None
 
 
+class ORJSONResponse(JSONResponse):
+    """
+    JSON response rendered with orjson. FastAPI's own ORJSONResponse is
+    deprecated in recent releases, so the few lines are kept here.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content)
+
+
+def _query_payload(result: AgentResponse) -> dict:
+    """
+    QueryResponse-shaped payload for a processed query, shared by the HTTP
+    and websocket handlers.
+    """
+    return {
+        "answer": result.answer,
+        "component": result.component or {},
+        "reasoning": result.reasoning or "",
+        "success": True,
+        "error": ""
+    }
+
+
+# Sent with responses answered from the graph's response cache
+CACHE_HIT_HEADERS = {"Cache-Control": "private, max-age=60"}
+
+# Tables with more rows than this are streamed by /api/query
+STREAM_TABLE_ROWS = 500
+# Rows encoded per chunk when streaming
+STREAM_CHUNK_ROWS = 256
+
+
+def _iter_table_payload(payload: dict) -> Iterator[bytes]:
+    """
+    Encode a query payload whose component is a data table piece by piece,
+    so the rows go out in chunks instead of as one large JSON body.
+    """
+    component = payload["component"]
+    rows = component["rows"]
+
+    head = {key: value for key, value in payload.items() if key != "component"}
+    table = {key: value for key, value in component.items() if key != "rows"}
+    # Both dicts are non-empty: drop their closing braces and splice in
+    # the component and its rows array
+    yield (
+        orjson.dumps(head)[:-1]
+        + b',"component":'
+        + orjson.dumps(table)[:-1]
+        + b',"rows":['
+    )
+    for start in range(0, len(rows), STREAM_CHUNK_ROWS):
+        # Encode a slice as a list and strip its brackets
+        chunk = orjson.dumps(rows[start:start + STREAM_CHUNK_ROWS])[1:-1]
+        yield chunk if start == 0 else b"," + chunk
+    yield b"]}}"
+
+
+def _query_error_payload(error: Exception) -> dict:
+    return {
+        "answer": "I apologize, but I encountered an error processing your request.",
+        "component": {},
+        "reasoning": "",
+        "success": False,
+        "error": str(error)
+    }
+
+
+def _load_warmup_schemas() -> List[dict]:
+    # Same index.json the web app fetches and sends with each query
+    with open(os.environ["WARMUP_SCHEMAS_PATH"], "rb") as f:
+        return orjson.loads(f.read())["schemas"]
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
     global agent_graph
     try:
-        agent_graph = MultiAgentGraph()
+        agent_graph = get_agent_graph()
         print("✅ Multi-agent graph initialized successfully")
     except Exception as e:
         print(f"❌ Failed to initialize agent graph: {e}")
         print("Make sure to set your GOOGLE_API_KEY environment variable")
+
+    # Only when configured: warm-up costs one LLM request per worker start
+    if agent_graph and os.getenv("WARMUP_SCHEMAS_PATH"):
+        try:
+            await agent_graph.awarmup(_load_warmup_schemas())
+        except Exception as e:
+            # Warm-up only saves first-request latency; serve regardless
+            print(f"⚠️ Agent graph warm-up failed: {e}")
     
     yield
     
@@ -39,7 +122,8 @@ app = FastAPI(
     title="Multi-Agent UI System",
     description="LangGraph-based multi-agent system for UI component selection",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 app.add_middleware(
@@ -73,120 +157,245 @@ async def process_query(request: QueryRequest):
         )
     
     try:
-        result: AgentResponse = agent_graph.process_query(
-            query=request.query,
-            context=request.context,
-            schemas=request.schemas
+        cache_key, result = agent_graph.lookup_cached_response(
+            request.query, request.context, request.schemas
         )
+        headers = CACHE_HIT_HEADERS
+        if result is None:
+            # The async path never blocks the event loop, and concurrent
+            # requests are coalesced into one batch window inside the graph
+            result = await agent_graph.aprocess_query(
+                query=request.query,
+                context=request.context,
+                schemas=request.schemas,
+                cache_key=cache_key
+            )
+            headers = None
         
-        return QueryResponse(
-            answer=result.answer,
-            component=result.component.model_dump() if result.component else {},
-            reasoning=result.reasoning or "",
-            success=True,
-            error=""
-        )
+        # Returned as a ready response: QueryResponse still documents the
+        # endpoint, but FastAPI skips re-validating and re-encoding the payload
+        payload = _query_payload(result)
+        component = payload["component"]
+        if (
+            component.get("type") == "data_table"
+            and len(component.get("rows") or ()) > STREAM_TABLE_ROWS
+        ):
+            return StreamingResponse(
+                _iter_table_payload(payload),
+                media_type="application/json",
+                headers=headers
+            )
+
+        return ORJSONResponse(content=payload, headers=headers)
     
     except Exception as e:
-        return QueryResponse(
-            answer="I apologize, but I encountered an error processing your request.",
-            component={},
-            reasoning="",
-            success=False,
-            error=str(e)
-        )
+        return ORJSONResponse(content=_query_error_payload(e))
+
+
+class WebSocketCodec(NamedTuple):
+    """
+    Frame format of one websocket connection, with its fixed messages
+    pre-encoded.
+    """
+
+    subprotocol: Optional[str]
+    binary_requests: bool
+    decode: Callable[[Any], QueryRequestStruct]
+    encode: Callable[[Any], bytes]
+    processing: bytes
+    not_initialized: bytes
+
+
+def _make_codec(
+    subprotocol: Optional[str], binary_requests: bool, decoder: Any, encode: Callable[[Any], bytes]
+) -> WebSocketCodec:
+    return WebSocketCodec(
+        subprotocol=subprotocol,
+        binary_requests=binary_requests,
+        decode=decoder.decode,
+        encode=encode,
+        processing=encode({"type": "status", "message": "Processing query..."}),
+        not_initialized=encode({"type": "error", "message": "Agent graph not initialized"}),
+    )
+
+
+# JSON text requests by default; clients that negotiate the msgpack
+# subprotocol send and receive msgpack frames, which are smaller for the
+# repetitive schema lists
+MSGPACK_SUBPROTOCOL = "agent.msgpack.v1"
+JSON_CODEC = _make_codec(
+    None,
+    False,
+    msgspec.json.Decoder(QueryRequestStruct),
+    orjson.dumps,
+)
+MSGPACK_CODEC = _make_codec(
+    MSGPACK_SUBPROTOCOL,
+    True,
+    msgspec.msgpack.Decoder(QueryRequestStruct),
+    msgspec.msgpack.Encoder().encode,
+)
 
 
 class ConnectionManager:
     def __init__(self):
-        self.active_connections: List[WebSocket] = []
+        # Each connection with the codec it negotiated
+        self.active_connections: Dict[WebSocket, WebSocketCodec] = {}
 
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
+    async def connect(self, websocket: WebSocket) -> WebSocketCodec:
+        if MSGPACK_SUBPROTOCOL in websocket.scope.get("subprotocols", ()):
+            codec = MSGPACK_CODEC
+        else:
+            codec = JSON_CODEC
+        await websocket.accept(subprotocol=codec.subprotocol)
+        self.active_connections[websocket] = codec
+        return codec
 
     def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
+        # pop with a default: a failed broadcast may already have dropped it
+        self.active_connections.pop(websocket, None)
 
-    async def send_personal_message(self, message: str, websocket: WebSocket):
-        await websocket.send_text(message)
+    async def send_personal_message(self, message: bytes, websocket: WebSocket):
+        # Encoded payloads are already bytes (UTF-8 for JSON), so they go out
+        # as binary frames instead of being decoded for send_text
+        await websocket.send_bytes(message)
 
-    async def broadcast(self, message: str):
-        for connection in self.active_connections:
-            await connection.send_text(message)
+    async def broadcast(self, message: Any):
+        # Encode once per codec, then send to every client concurrently; a
+        # client whose send fails is dropped rather than failing the broadcast
+        connections = list(self.active_connections.items())
+        encoded = {codec: codec.encode(message) for codec in set(self.active_connections.values())}
+        results = await asyncio.gather(
+            *(connection.send_bytes(encoded[codec]) for connection, codec in connections),
+            return_exceptions=True
+        )
+        for (connection, _), result in zip(connections, results):
+            if isinstance(result, Exception):
+                self.disconnect(connection)
 
 
 manager = ConnectionManager()
 
+# Frames already waiting when a message arrives are read with it, up to
+# this many, so their queries share a batch window in the graph
+WS_DRAIN_MAX = 8
+WS_DRAIN_TIMEOUT = 0.002
+
+
+async def _receive_frame(websocket: WebSocket, codec: WebSocketCodec) -> Union[str, bytes]:
+    if codec.binary_requests:
+        return await websocket.receive_bytes()
+    return await websocket.receive_text()
+
+
+async def drain_pending(
+    websocket: WebSocket,
+    codec: WebSocketCodec,
+    max_messages: int = WS_DRAIN_MAX,
+    timeout: float = WS_DRAIN_TIMEOUT,
+) -> List[Union[str, bytes]]:
+    """
+    Wait for the next frame, then collect any that follow within `timeout`
+    of each other, up to `max_messages` in total. Frames come back undecoded,
+    so a bad one cannot cost the others read with it.
+    """
+    frames = [await _receive_frame(websocket, codec)]
+    while len(frames) < max_messages:
+        try:
+            frames.append(
+                await asyncio.wait_for(_receive_frame(websocket, codec), timeout)
+            )
+        except asyncio.TimeoutError:
+            break
+    return frames
+
+
+def _start_query(codec: WebSocketCodec, frame: Union[str, bytes]) -> Union[asyncio.Task, Exception]:
+    """
+    Decode one frame and start its query. A frame that does not decode into
+    a QueryRequestStruct yields its error, answered like a failed query.
+    """
+    try:
+        request = codec.decode(frame)
+    except (msgspec.DecodeError, msgspec.ValidationError) as e:
+        return e
+    return asyncio.ensure_future(
+        agent_graph.aprocess_query(
+            query=request.query,
+            context=request.context,
+            schemas=request.schemas
+        )
+    )
+
 
 @app.websocket("/ws/query")
 async def websocket_endpoint(websocket: WebSocket):
-    await manager.connect(websocket)
+    codec = await manager.connect(websocket)
+    queries: List[Union[asyncio.Task, Exception]] = []
     try:
         while True:
-            data = await websocket.receive_text()
-            request_data = json.loads(data)
+            frames = await drain_pending(websocket, codec)
             
             if not agent_graph:
-                error_response = {
-                    "type": "error",
-                    "message": "Agent graph not initialized"
-                }
-                await manager.send_personal_message(
-                    json.dumps(error_response), 
-                    websocket
-                )
+                for _ in frames:
+                    await manager.send_personal_message(codec.not_initialized, websocket)
                 continue
             
-            await manager.send_personal_message(
-                json.dumps({"type": "status", "message": "Processing query..."}),
-                websocket
-            )
+            # Start every query first so they are batched together; results
+            # still go back in request order, as the client expects
+            queries = [_start_query(codec, frame) for frame in frames]
+            for _ in queries:
+                await manager.send_personal_message(codec.processing, websocket)
             
-            try:
-                result: AgentResponse = await agent_graph.aprocess_query(
-                    query=request_data.get("query", ""),
-                    context=request_data.get("context", ""),
-                    schemas=request_data.get("schemas")
-                )
-                
-                response = {
-                    "type": "result",
-                    "data": {
-                        "answer": result.answer,
-                        "component": result.component.model_dump() if result.component else {},
-                        "reasoning": result.reasoning or "",
-                        "success": True,
-                        "error": ""
+            for query in queries:
+                try:
+                    if isinstance(query, Exception):
+                        raise query
+                    result: AgentResponse = await query
+                    
+                    response = {
+                        "type": "result",
+                        "data": _query_payload(result)
                     }
-                }
-                
-                await manager.send_personal_message(
-                    json.dumps(response),
-                    websocket
-                )
-                
-            except Exception as e:
-                error_response = {
-                    "type": "result",
-                    "data": {
-                        "answer": "I apologize, but I encountered an error processing your request.",
-                        "component": {},
-                        "reasoning": "",
-                        "success": False,
-                        "error": str(e)
+                    
+                    await manager.send_personal_message(codec.encode(response), websocket)
+                    
+                except WebSocketDisconnect:
+                    raise
+                except Exception as e:
+                    error_response = {
+                        "type": "result",
+                        "data": _query_error_payload(e)
                     }
-                }
-                
-                await manager.send_personal_message(
-                    json.dumps(error_response),
-                    websocket
-                )
+                    
+                    await manager.send_personal_message(
+                        codec.encode(error_response),
+                        websocket
+                    )
     
     except WebSocketDisconnect:
+        pass
+    finally:
+        # Also reached when the handler fails, so no closed socket is left
+        # among the active connections
         manager.disconnect(websocket)
+        # Stop waiting on this client's queries. Their graph runs belong to
+        # the query batcher and still finish (filling the response cache)
+        for query in queries:
+            if isinstance(query, asyncio.Task):
+                query.cancel()
 
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # "auto" picks uvloop and httptools when installed (uvicorn[standard],
+    # except uvloop on Windows). Workers are separate processes, each with
+    # its own graph, cache and websocket clients
+    uvicorn.run(
+        "main:app",
+        host=os.getenv("HOST", "0.0.0.0"),
+        port=int(os.getenv("PORT", "8000")),
+        loop=os.getenv("UVICORN_LOOP", "auto"),
+        http=os.getenv("UVICORN_HTTP", "auto"),
+        workers=int(os.getenv("WEB_CONCURRENCY", "1"))
+    )
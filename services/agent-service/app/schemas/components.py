@@ -1,5 +1,5 @@
-from pydantic import BaseModel, Field
-from typing import List, Optional, Union, Literal
+from pydantic import BaseModel, ConfigDict, Field, TypeAdapter
+from typing import Annotated, Any, Dict, List, Optional, Union, Literal
 from enum import Enum
 
 
@@ -18,6 +18,8 @@ class ChartType(str, Enum):
 
 
 class WeatherCardSchema(BaseModel):
+    model_config = ConfigDict(frozen=True, extra="ignore")
+
     type: Literal[ComponentType.WEATHER_CARD] = ComponentType.WEATHER_CARD
     location: str = Field(description="Location name (e.g., 'Paris, France')")
     temperature: float = Field(description="Current temperature in Celsius")
@@ -28,12 +30,16 @@ class WeatherCardSchema(BaseModel):
 
 
 class ChartDataPoint(BaseModel):
+    model_config = ConfigDict(frozen=True, extra="ignore")
+
     label: str = Field(description="Data point label")
     value: Union[int, float] = Field(description="Data point value")
     color: Optional[str] = Field(None, description="Optional color for this data point")
 
 
 class ChartCardSchema(BaseModel):
+    model_config = ConfigDict(frozen=True, extra="ignore")
+
     type: Literal[ComponentType.CHART_CARD] = ComponentType.CHART_CARD
     title: str = Field(description="Chart title")
     chart_type: ChartType = Field(description="Type of chart to render")
@@ -43,24 +49,26 @@ class ChartCardSchema(BaseModel):
 
 
 class TableColumn(BaseModel):
+    model_config = ConfigDict(frozen=True, extra="ignore")
+
     key: str = Field(description="Column identifier")
     label: str = Field(description="Column display name")
     sortable: bool = Field(default=True, description="Whether column is sortable")
 
 
-class TableRow(BaseModel):
-    data: dict = Field(description="Row data as key-value pairs")
-
-
 class DataTableSchema(BaseModel):
+    model_config = ConfigDict(frozen=True, extra="ignore")
+
     type: Literal[ComponentType.DATA_TABLE] = ComponentType.DATA_TABLE
     title: str = Field(description="Table title")
     columns: List[TableColumn] = Field(description="Table columns definition")
-    rows: List[TableRow] = Field(description="Table rows data")
+    rows: List[Dict[str, Any]] = Field(description="Table rows as column key to value")
     searchable: bool = Field(default=True, description="Whether table is searchable")
 
 
 class InfoCardSchema(BaseModel):
+    model_config = ConfigDict(frozen=True, extra="ignore")
+
     type: Literal[ComponentType.INFO_CARD] = ComponentType.INFO_CARD
     title: str = Field(description="Card title")
     content: str = Field(description="Card content/description")
@@ -70,12 +78,23 @@ class InfoCardSchema(BaseModel):
     )
 
 
-ComponentSchema = Union[WeatherCardSchema, ChartCardSchema, DataTableSchema, InfoCardSchema]
+# Tagged on `type` so validation dispatches straight to the matching schema
+ComponentSchema = Annotated[
+    Union[WeatherCardSchema, ChartCardSchema, DataTableSchema, InfoCardSchema],
+    Field(discriminator="type"),
+]
+
+# Validates a component dict into its schema model where one is needed
+COMPONENT_ADAPTER = TypeAdapter(ComponentSchema)
 
 
 class AgentResponse(BaseModel):
     answer: str = Field(description="Natural language answer from the Answer Agent")
-    component: Optional[ComponentSchema] = Field(
+    # Kept as the agents' JSON output and shipped as-is. Built-in component
+    # types are validated when produced (the static UI agent's tools, or
+    # COMPONENT_ADAPTER in the graph for the dynamic path); components of
+    # client-defined types carry the LLM's tool arguments unchecked
+    component: Optional[Dict[str, Any]] = Field(
         None, description="Selected UI component with structured data"
     )
     reasoning: Optional[str] = Field(
@@ -1,5 +1,6 @@
 from pydantic import BaseModel, Field
 from typing import List, Dict, Any, Optional
+import msgspec
 
 
 class QueryRequest(BaseModel):
@@ -8,6 +9,18 @@ class QueryRequest(BaseModel):
     schemas: Optional[List[Dict[str, Any]]] = Field(default=None, description="Available UI component schemas")
 
 
+class QueryRequestStruct(msgspec.Struct):
+    """
+    msgspec mirror of QueryRequest for websocket messages, which are decoded
+    and type-checked in one pass without building a pydantic model. A missing
+    query defaults to empty, as the websocket handler has always allowed.
+    """
+
+    query: str = ""
+    context: str = ""
+    schemas: Optional[List[Dict[str, Any]]] = None
+
+
 class QueryResponse(BaseModel):
     answer: str = Field(description="Natural language response")
     component: dict = Field(description="Structured component data")
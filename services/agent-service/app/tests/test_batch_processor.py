@@ -0,0 +1,111 @@
+import asyncio
+
+import pytest
+
+from agents.batch_processor import BatchProcessor
+
+
+def make_processor(**kwargs):
+    """
+    BatchProcessor that doubles each item and records the batches it sees.
+    Items that are exceptions are returned as that item's result.
+    """
+    batches = []
+
+    async def process_batch(items):
+        batches.append(list(items))
+        return [item if isinstance(item, Exception) else item * 2 for item in items]
+
+    return BatchProcessor(process_batch, **kwargs), batches
+
+
+@pytest.mark.asyncio
+async def test_batch_size_is_capped():
+    processor, batches = make_processor(max_batch=3, max_wait_ms=1000)
+
+    results = await asyncio.gather(*(processor.submit(i) for i in range(7)))
+
+    assert results == [i * 2 for i in range(7)]
+    assert [len(batch) for batch in batches] == [3, 3, 1]
+    assert [item for batch in batches for item in batch] == list(range(7))
+
+
+@pytest.mark.asyncio
+async def test_window_timeout_closes_batch():
+    processor, batches = make_processor(max_batch=100, max_wait_ms=20)
+
+    first = await asyncio.wait_for(
+        asyncio.gather(processor.submit(1), processor.submit(2)), timeout=1
+    )
+    await asyncio.sleep(0.05)
+    second = await asyncio.wait_for(processor.submit(3), timeout=1)
+
+    assert first == [2, 4]
+    assert second == 6
+    assert batches == [[1, 2], [3]]
+
+
+@pytest.mark.asyncio
+async def test_exception_reaches_only_its_caller():
+    processor, _ = make_processor(max_batch=8, max_wait_ms=10)
+
+    results = await asyncio.gather(
+        processor.submit(1),
+        processor.submit(ValueError("bad item")),
+        processor.submit(3),
+        return_exceptions=True,
+    )
+
+    assert results[0] == 2
+    assert isinstance(results[1], ValueError)
+    assert results[2] == 6
+
+
+@pytest.mark.asyncio
+async def test_failed_batch_call_reaches_every_caller():
+    async def process_batch(items):
+        raise RuntimeError("backend down")
+
+    processor = BatchProcessor(process_batch, max_batch=8, max_wait_ms=10)
+
+    results = await asyncio.gather(
+        processor.submit(1), processor.submit(2), return_exceptions=True
+    )
+
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+@pytest.mark.asyncio
+async def test_cancelled_caller_does_not_break_batch():
+    release = asyncio.Event()
+    batches = []
+
+    async def process_batch(items):
+        batches.append(list(items))
+        await release.wait()
+        return [item * 2 for item in items]
+
+    processor = BatchProcessor(process_batch, max_batch=8, max_wait_ms=10)
+
+    tasks = [asyncio.create_task(processor.submit(i)) for i in range(3)]
+    # Let the window close and the batch reach process_batch
+    while not batches:
+        await asyncio.sleep(0.005)
+    tasks[1].cancel()
+    release.set()
+
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+
+    assert batches == [[0, 1, 2]]
+    assert results[0] == 0
+    assert isinstance(results[1], asyncio.CancelledError)
+    assert results[2] == 4
+
+
+def test_processor_moves_to_a_new_event_loop():
+    processor, batches = make_processor(max_batch=8, max_wait_ms=5)
+
+    assert asyncio.run(processor.submit(1)) == 2
+    # The first loop is closed; the queue and worker are rebuilt on this one
+    assert asyncio.run(processor.submit(2)) == 4
+    assert batches == [[1], [2]]
@@ -0,0 +1,82 @@
+from pathlib import Path
+
+import orjson
+import pytest
+from pydantic import ValidationError
+
+from agents.dynamic_tool_generator import DynamicToolGenerator
+from agents.graph import BUILTIN_COMPONENT_TYPES, MultiAgentGraph
+
+SCHEMAS_PATH = Path(__file__).resolve().parents[4] / "schemas" / "index.json"
+
+# Valid tool arguments for each schema shipped in schemas/index.json
+TOOL_ARGS = {
+    "WeatherCard": {
+        "location": "Paris",
+        "temperature": 21.5,
+        "condition": "Sunny",
+        "humidity": 40,
+        "wind_speed": 12.0,
+        "icon": "sunny",
+    },
+    "InfoCard": {"title": "Note", "content": "Hello", "icon": "info"},
+    "DataTable": {
+        "title": "Sales",
+        "columns": [{"key": "region", "label": "Region"}],
+        "rows": [{"region": "EU"}],
+    },
+    "ChartCard": {
+        "title": "Sales",
+        "chart_type": "bar",
+        "data": [{"label": "EU", "value": 3}],
+        "x_axis_label": "Region",
+        "y_axis_label": "Units",
+    },
+}
+
+
+def shipped_schemas():
+    return orjson.loads(SCHEMAS_PATH.read_bytes())["schemas"]
+
+
+def run_tool(schema, args):
+    """Call the schema's generated tool and return the component it builds"""
+    tool = DynamicToolGenerator.create_tool_from_schema(schema)
+    return orjson.loads(tool.func(**args))["component"]
+
+
+@pytest.mark.parametrize("schema", shipped_schemas(), ids=lambda schema: schema["name"])
+def test_shipped_schemas_produce_builtin_types(schema):
+    component = run_tool(schema, TOOL_ARGS[schema["name"]])
+
+    assert component["type"] in BUILTIN_COMPONENT_TYPES
+    # Built-in types are validated, so the check returns a re-dumped copy
+    checked = MultiAgentGraph._check_component(component)
+    assert checked is not component
+    assert checked["type"] == component["type"]
+
+
+def test_invalid_builtin_component_is_rejected():
+    schema = next(schema for schema in shipped_schemas() if schema["name"] == "DataTable")
+    component = run_tool(schema, {**TOOL_ARGS["DataTable"], "columns": ["region"]})
+
+    with pytest.raises(ValidationError):
+        MultiAgentGraph._check_component(component)
+
+
+def test_client_defined_type_passes_through():
+    schema = {
+        "name": "StockTicker",
+        "tool_definition": {
+            "name": "render_stock_ticker",
+            "parameters": {
+                "type": "object",
+                "properties": {"symbol": {"type": "string"}},
+                "required": ["symbol"],
+            },
+        },
+    }
+    component = run_tool(schema, {"symbol": "ACME"})
+
+    assert component == {"type": "stock_ticker", "symbol": "ACME"}
+    assert MultiAgentGraph._check_component(component) is component